@@ -1,10 +1,37 @@
 import os
+from typing import Literal, Optional
 
+from pydantic import field_validator, model_validator
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     TOKEN: str
+    # Адрес собственного Bot API сервера (например, локального), по умолчанию api.telegram.org
+    BOT_API_URL: Optional[str] = None
+
+    UPDATES_MODE: Literal["polling", "webhook"] = "polling"
+    WEBHOOK_URL: Optional[str] = None
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: Optional[str] = None
+    WEBAPP_HOST: str = "0.0.0.0"
+    WEBAPP_PORT: int = 8080
+    HEALTH_PATH: str = "/health"
+    SHUTDOWN_TIMEOUT_SECONDS: int = 30
+    METRICS_HOST: str = "127.0.0.1"
+    # Пустое значение или 0 отключает эндпоинт /metrics; воркеры слушают METRICS_PORT + 1 + номер воркера
+    METRICS_PORT: Optional[int] = 9100
+
+    # Количество процессов-воркеров, 0 - обработка в текущем процессе
+    WORKERS: int = 0
+    # Апдейты одного чата обрабатываются по порядку, разных чатов - параллельно.
+    # Ограничение числа чатов, апдейты которых обрабатываются одновременно, 0 - без ограничения
+    ORDERING_MAX_RUNNING_KEYS: int = 100
+
+    # Путь к журналу апдейтов (SQLite), если не задан - апдейты обрабатываются сразу
+    JOURNAL_PATH: Optional[str] = None
+    JOURNAL_MAX_IN_FLIGHT: int = 100
+    JOURNAL_MAX_ATTEMPTS: int = 5
 
     DB_USER: str
     DB_PASSWORD: str
@@ -12,6 +39,13 @@ class Settings(BaseSettings):
     DB_PORT: int
     DB_NAME: str
 
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 30 * 60
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500
+
     APP_DIR: str = os.path.dirname(os.path.realpath(__file__))
 
     CACHE_DIR_NAME: str = "__cache__"
@@ -19,6 +53,70 @@ class Settings(BaseSettings):
 
     DAYS_TO_SAVE_CONTENT: int = 30
     CRON_SECONDS_TO_DELETE_MESSAGES: int = 60 * 60
+    RETENTION_BATCH_SIZE: int = 5000
+    PARTITIONS_DAYS_AHEAD: int = 7
+    # tiered: CACHE_DIR с квотой HOT_STORAGE_MAX_BYTES поверх COLD_STORAGE_DIR или, если он не задан, S3
+    STORAGE_BACKEND: Literal["filesystem", "s3", "tiered"] = "filesystem"
+    HOT_STORAGE_MAX_BYTES: int = 10 * 1024 ** 3
+    COLD_STORAGE_DIR: Optional[str] = None
+    STORAGE_DELETE_CONCURRENCY: int = 32
+    STORAGE_CHUNK_SIZE: int = 256 * 1024
+
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_BUCKET: Optional[str] = None
+    S3_ACCESS_KEY: Optional[str] = None
+    S3_SECRET_KEY: Optional[str] = None
+    S3_REGION: str = "us-east-1"
+    S3_PREFIX: str = ""
+    S3_MAX_CONNECTIONS: int = 64
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+
+    BUSINESS_CONNECTION_CACHE_SIZE: int = 10_000
+    BUSINESS_CONNECTION_CACHE_TTL: int = 60 * 60
+
+    KNOWN_USERS_CACHE_SIZE: int = 100_000
+    USER_WRITER_BATCH_SIZE: int = 500
+    USER_WRITER_FLUSH_MILLISECONDS: int = 200
+
+    MESSAGE_WRITER_BATCH_SIZE: int = 200
+    MESSAGE_WRITER_FLUSH_MILLISECONDS: int = 20
+    # Повторы записи пачки при сбое базы, пауза удваивается с каждой попыткой
+    WRITER_MAX_ATTEMPTS: int = 5
+    WRITER_RETRY_MILLISECONDS: int = 200
+
+    RECENT_MESSAGES_CACHE_SIZE: int = 100_000
+    RECENT_MESSAGES_CACHE_TTL: int = 60 * 60
+    RECENT_MESSAGES_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    DELETION_DIGEST_MILLISECONDS: int = 1000
+
+    # Лимиты Telegram: около 30 сообщений в секунду всего и 1 в секунду в один чат
+    OUTBOUND_GLOBAL_RATE: float = 30
+    OUTBOUND_CHAT_RATE: float = 1
+    OUTBOUND_CHAT_BURST: float = 3
+    OUTBOUND_MAX_RETRIES: int = 5
+
+    DOWNLOAD_WORKERS: int = 4
+    DOWNLOAD_QUEUE_SIZE: int = 1000
+    # При запуске заново скачиваются незавершенные (PENDING/FAILED) файлы сообщений за последние дни
+    DOWNLOAD_RESUME_DAYS: int = 1
+
+    UPLOADED_FILE_ID_CACHE_SIZE: int = 10_000
+    UPLOADED_FILE_ID_CACHE_TTL: int = 24 * 60 * 60
+
+    @field_validator("METRICS_PORT", mode="before")
+    @classmethod
+    def parse_metrics_port(cls, value):
+        # Пустая переменная окружения означает "не задано", а не ошибку разбора числа
+        if value == "":
+            return None
+        return value
+
+    @model_validator(mode="after")
+    def check_webhook_url(self) -> "Settings":
+        if self.UPDATES_MODE == "webhook" and not self.WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL is required when UPDATES_MODE is webhook")
+        return self
 
     def get_db_url(self) -> str:
         return (
@@ -0,0 +1,15 @@
+from aiogram import Dispatcher
+
+
+def setup_routers(dp: Dispatcher):
+    from app.controller.business_message import router as business_message_router
+    from app.controller.private import router as private_router
+
+    from app.utils.metrics import HandlerMetricsMiddleware
+
+    for router in (business_message_router, private_router):
+        for observer in router.observers.values():
+            observer.middleware(HandlerMetricsMiddleware())
+
+    dp.include_router(business_message_router)
+    dp.include_router(private_router)
@@ -4,7 +4,7 @@ from aiogram.filters.command import CommandStart
 from aiogram.types import Message
 
 from app.database.models import User
-from app.loader import user_repository
+from app.loader import user_writer
 from app.utils.patterns import START_MESSAGE_PATTERN
 
 router = Router()
@@ -13,8 +13,10 @@ router.my_chat_member.filter(F.chat.type == ChatType.PRIVATE)
 
 @router.message(CommandStart())
 async def user_start_command(message: Message):
-    await user_repository.get_or_create(
-        User(id=message.from_user.id, username=message.from_user.username, full_name=message.from_user.full_name),
-        filter_kwargs={"id": message.from_user.id}
+    # Владелец бизнес-подключения должен быть в базе до сохранения его сообщений
+    saved = user_writer.upsert(
+        User(id=message.from_user.id, username=message.from_user.username, full_name=message.from_user.full_name)
     )
+    await user_writer.flush()
+    await saved
     await message.answer(START_MESSAGE_PATTERN)
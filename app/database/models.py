@@ -1,7 +1,9 @@
+import enum
 from datetime import datetime
 
 from aiogram.types import ContentType
-from sqlalchemy import Integer, ForeignKey, BigInteger, JSON, VARCHAR, TEXT, Enum
+from sqlalchemy import Integer, ForeignKey, BigInteger, VARCHAR, TEXT, Enum, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import String
 from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncAttrs
@@ -24,20 +26,53 @@ class BaseModel(AsyncAttrs, DeclarativeBase):
 
 class User(BaseModel):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
-    username: Mapped[str] = mapped_column(String, unique=True, nullable=True)
+    # Не уникален: username может перейти к другому аккаунту
+    username: Mapped[str] = mapped_column(String, nullable=True)
     full_name: Mapped[str] = mapped_column(String, nullable=False)
 
 
+class FileState(str, enum.Enum):
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+
 class UserPeerMessage(BaseModel):
+    # Таблица секционирована по дням (created_at), устаревшие секции удаляются целиком
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
+    created_at: Mapped[datetime] = mapped_column(primary_key=True, server_default=func.now())
+
     user_id: Mapped[int] = mapped_column(ForeignKey(f"{User.__tablename__}.id"), nullable=False)
     chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     message_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
     type: Mapped[ContentType] = mapped_column(Enum(ContentType), nullable=False)
-    message: Mapped[dict] = mapped_column(JSON, nullable=False)
+    message: Mapped[dict] = mapped_column(JSONB, nullable=False)
     text: Mapped[str] = mapped_column(TEXT, nullable=True)
 
     file_id: Mapped[str] = mapped_column(VARCHAR(256), nullable=True)
     filepath: Mapped[str] = mapped_column(VARCHAR(256), nullable=True)
     filename: Mapped[str] = mapped_column(VARCHAR(256), nullable=True)
     mimetype: Mapped[str] = mapped_column(VARCHAR(128), nullable=True)
+    file_state: Mapped[FileState] = mapped_column(Enum(FileState), nullable=True)
+
+
+# Индекс под поиск последней версии сообщения (get_last_message)
+Index(
+    "ix_userpeermessages_user_chat_message_created_at",
+    UserPeerMessage.user_id,
+    UserPeerMessage.chat_id,
+    UserPeerMessage.message_id,
+    UserPeerMessage.created_at.desc(),
+)
+
+# Индекс под удаление устаревших сообщений (delete_messages_earlier_date)
+Index("ix_userpeermessages_created_at", UserPeerMessage.created_at)
+
+# Индекс под проверку ссылок на файл перед его удалением (get_referenced_filepaths)
+Index(
+    "ix_userpeermessages_filepath",
+    UserPeerMessage.filepath,
+    postgresql_where=UserPeerMessage.filepath.isnot(None),
+)
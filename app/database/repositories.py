@@ -1,11 +1,12 @@
 from collections.abc import Sequence
-from datetime import datetime
-from typing import Dict, Any, Tuple
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Tuple, List, Iterable, Set, Optional
 
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, delete, update, func, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.models import BaseModel, User, UserPeerMessage
+from app.database.models import BaseModel, User, UserPeerMessage, FileState
 from app.database.session import connection
 
 
@@ -20,6 +21,14 @@ class BaseRepository:
         await session.commit()
         return instance
 
+    @connection
+    async def create_many(
+            self, instances: Sequence[BaseModel], session: AsyncSession
+    ) -> Sequence[BaseModel]:
+        session.add_all(instances)
+        await session.commit()
+        return instances
+
     @connection
     async def get_or_none(self, *args: tuple[Any], session: AsyncSession, **kwargs: Dict[str, Any]) -> BaseModel:
         result = await session.execute(select(self.model).filter(*args).filter_by(**kwargs))
@@ -64,6 +73,13 @@ class BaseRepository:
 
         return total, items
 
+    @connection
+    async def update(
+            self, *args: tuple[Any], session: AsyncSession, values: Dict[str, Any], **kwargs: Dict[str, Any]
+    ):
+        await session.execute(update(self.model).filter(*args).filter_by(**kwargs).values(**values))
+        await session.commit()
+
     @connection
     async def delete(self, *args: tuple[Any], session: AsyncSession, **kwargs: Dict[str, Any]):
         await session.execute(delete(self.model).filter(*args).filter_by(**kwargs))
@@ -73,22 +89,87 @@ class BaseRepository:
 class UserRepository(BaseRepository):
     model = User
 
+    @connection
+    async def upsert_many(self, users: List[Dict[str, Any]], session: AsyncSession):
+        """
+        Вставляет или обновляет пользователей одним запросом INSERT ... ON CONFLICT (id) DO UPDATE.
+        """
+        # В одном запросе нельзя дважды обновить одну и ту же строку, оставляем последние данные
+        users = list({user["id"]: user for user in users}.values())
+        if not users:
+            return
+
+        query = insert(User).values(users)
+        await session.execute(
+            query.on_conflict_do_update(
+                index_elements=[User.id],
+                set_={
+                    "username": query.excluded.username,
+                    "full_name": query.excluded.full_name,
+                    "updated_at": func.now(),
+                }
+            )
+        )
+        await session.commit()
+
 
 class UserPeerMessageRepository(BaseRepository):
     model = UserPeerMessage
 
     @connection
     async def get_last_message(
-            self, user_id: int, chat_id: int, message_id: int, session: AsyncSession
+            self, user_id: int, chat_id: int, message_id: int, since: datetime, session: AsyncSession
     ) -> BaseModel:
+        """
+        Последняя версия сообщения. Граница since отсекает секции старше срока хранения.
+        """
         result = await session.execute(
             select(UserPeerMessage)
             .filter_by(user_id=user_id, chat_id=chat_id, message_id=message_id)
+            .filter(UserPeerMessage.created_at > since)
             .order_by(UserPeerMessage.created_at.desc())
             .limit(1)
         )
         return result.scalar_one_or_none()
 
+    @connection
+    async def get_last_messages(
+            self, user_id: int, chat_id: int, message_ids: Sequence[int], since: datetime, session: AsyncSession
+    ) -> Sequence[BaseModel]:
+        """
+        Возвращает последние версии сообщений для всех message_ids одним запросом DISTINCT ON.
+        """
+        result = await session.execute(
+            select(UserPeerMessage)
+            .filter_by(user_id=user_id, chat_id=chat_id)
+            .filter(UserPeerMessage.message_id.in_(message_ids))
+            .filter(UserPeerMessage.created_at > since)
+            .distinct(UserPeerMessage.message_id)
+            .order_by(UserPeerMessage.message_id, UserPeerMessage.created_at.desc())
+        )
+        return result.scalars().all()
+
+    @connection
+    async def get_unfinished_downloads(
+            self, session: AsyncSession, since: datetime, after: Optional[Tuple[datetime, int]] = None,
+            limit: int = 1000
+    ) -> Sequence[BaseModel]:
+        """
+        Сообщения начиная с since, файл которых так и не скачался (PENDING после перезапуска или FAILED).
+        Постраничный обход по (created_at, id), начиная после after.
+        """
+        query = (
+            select(UserPeerMessage)
+            .filter(UserPeerMessage.created_at >= since)
+            .filter(UserPeerMessage.file_state.in_([FileState.PENDING, FileState.FAILED]))
+        )
+        if after:
+            query = query.filter(tuple_(UserPeerMessage.created_at, UserPeerMessage.id) > after)
+        result = await session.execute(
+            query.order_by(UserPeerMessage.created_at, UserPeerMessage.id).limit(limit)
+        )
+        return result.scalars().all()
+
     @connection
     async def get_messages_earlier_date(
             self, session: AsyncSession, from_date: datetime.date, limit: int = 1000
@@ -100,3 +181,94 @@ class UserPeerMessageRepository(BaseRepository):
             .limit(limit)
         )
         return result.scalars().all()
+
+    @connection
+    async def delete_messages_earlier_date(
+            self, session: AsyncSession, from_date: datetime.date, limit: int = 1000
+    ) -> Sequence[Optional[str]]:
+        """
+        Удаляет пачку сообщений старше from_date одним DELETE ... RETURNING и возвращает их filepath.
+        """
+        ids = (
+            select(UserPeerMessage.id)
+            .filter(UserPeerMessage.created_at <= from_date)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        # Условие на created_at и во внешнем DELETE: без него id ищется в индексе каждой партиции
+        result = await session.execute(
+            delete(UserPeerMessage)
+            .filter(UserPeerMessage.created_at <= from_date, UserPeerMessage.id.in_(ids))
+            .returning(UserPeerMessage.filepath)
+        )
+        await session.commit()
+        return result.scalars().all()
+
+    @connection
+    async def get_referenced_filepaths(self, filepaths: Iterable[str], session: AsyncSession) -> Set[str]:
+        """
+        Возвращает те из filepaths, на которые еще ссылаются сохраненные сообщения.
+        """
+        result = await session.execute(
+            select(UserPeerMessage.filepath).filter(UserPeerMessage.filepath.in_(list(filepaths))).distinct()
+        )
+        return set(result.scalars().all())
+
+    @staticmethod
+    def get_partition_name(day: date) -> str:
+        return f"{UserPeerMessage.__tablename__}_p{day:%Y%m%d}"
+
+    @connection
+    async def get_partitions(self, session: AsyncSession) -> Dict[date, str]:
+        """
+        Возвращает дневные секции таблицы сообщений (без секции по умолчанию).
+        """
+        result = await session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+                "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                "WHERE parent.relname = :table"
+            ),
+            {"table": UserPeerMessage.__tablename__}
+        )
+        prefix = f"{UserPeerMessage.__tablename__}_p"
+        return {
+            datetime.strptime(name[len(prefix):], "%Y%m%d").date(): name
+            for name in result.scalars().all() if name.startswith(prefix)
+        }
+
+    @connection
+    async def create_partition(self, day: date, session: AsyncSession):
+        """
+        Создает секцию за день. Строки этого дня, уже попавшие в секцию по умолчанию, переносятся в новую секцию:
+        иначе PostgreSQL не даст создать секцию, пересекающуюся с ними.
+        """
+        table = UserPeerMessage.__tablename__
+        name = self.get_partition_name(day)
+        start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+        await session.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+        await session.execute(
+            text(
+                f"WITH moved AS ("
+                f"DELETE FROM {table}_default WHERE created_at >= '{start}' AND created_at < '{end}' RETURNING *"
+                f") INSERT INTO {name} SELECT * FROM moved"
+            )
+        )
+        # Индексы и внешний ключ секция получает от родительской таблицы при подключении
+        await session.execute(
+            text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+        )
+        await session.commit()
+
+    @connection
+    async def drop_partition(self, day: date, session: AsyncSession) -> Tuple[int, Sequence[str]]:
+        """
+        Удаляет секцию за день целиком и возвращает количество ее строк и пути файлов ее сообщений.
+        """
+        name = self.get_partition_name(day)
+        result = await session.execute(text(f"SELECT filepath, count(*) FROM {name} GROUP BY filepath"))
+        counts = result.all()
+        await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        await session.commit()
+        return sum(count for _, count in counts), [filepath for filepath, _ in counts if filepath]
@@ -1,16 +1,53 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.config import settings
+from app.utils.metrics import db_pool_size, db_pool_checked_out, db_pool_overflow
 
-engine = create_async_engine(url=settings.get_db_url())
+engine = create_async_engine(
+    url=make_url(settings.get_db_url()).update_query_dict(
+        {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+    ),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+db_pool_size.set_function(engine.pool.size)
+db_pool_checked_out.set_function(engine.pool.checkedout)
+db_pool_overflow.set_function(lambda: max(engine.pool.overflow(), 0))
+
+# Сессия текущего апдейта, общая для всех вызовов репозиториев внутри обработчика.
+# Транзакция в ней завершается после каждого вызова, поэтому между вызовами соединение не занято
+current_session: ContextVar[Optional[AsyncSession]] = ContextVar("current_session", default=None)
+
 
 def connection(method):
     async def wrapper(*args, **kwargs):
         if kwargs.get("session"):
             return await method(*args, **kwargs)
 
+        if session := current_session.get():
+            try:
+                result = await method(*args, session=session, **kwargs)
+            except Exception:
+                await session.rollback()
+                raise
+            # Чтение тоже открывает транзакцию. Без завершения соединение простаивало бы в ней весь обработчик
+            # (ожидание загрузки, паузы отправки), занимая пул и блокируя создание и удаление партиций
+            if session.in_transaction():
+                await session.commit()
+            return result
+
         async with async_session_maker() as session:
             try:
                 # Явно не открываем транзакции, так как они уже есть в контексте
@@ -22,3 +59,31 @@ def connection(method):
                 await session.close()  # Закрываем сессию
 
     return wrapper
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """
+    Открывает одну сессию на весь блок: все вызовы репозиториев внутри используют ее.
+    Каждый вызов завершает свою транзакцию: записи сразу видны фоновым воркерам, а соединение возвращается в пул.
+    """
+    async with async_session_maker() as session:
+        token = current_session.set(session)
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            current_session.reset(token)
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        async with unit_of_work():
+            return await handler(event, data)
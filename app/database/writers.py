@@ -0,0 +1,162 @@
+import abc
+import asyncio
+import contextvars
+import logging
+from typing import Any, Dict, Generic, List, Set, Tuple, TypeVar
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.database.models import User, UserPeerMessage
+from app.database.repositories import UserRepository, UserPeerMessageRepository
+from app.utils.cache import TTLCache
+from app.utils.metrics import stage_duration
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BatchWriter(abc.ABC, Generic[T]):
+    """
+    Накапливает строки от конкурентных обработчиков и записывает их пачкой
+    раз в flush_interval секунд или по достижении max_batch_size строк.
+    Сбой базы повторяется с экспоненциальной паузой до max_attempts раз. Пачка, отвергнутая из-за отдельных строк
+    (нарушение ключа, слишком длинное значение), делится пополам, пока плохие строки не останутся по одной.
+    """
+
+    def __init__(self, max_batch_size: int, flush_interval: float, max_attempts: int = 5, retry_delay: float = 0.2):
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._writing: List[Tuple[T, asyncio.Future]] = []
+        self._lock = asyncio.Lock()
+
+    @abc.abstractmethod
+    async def write(self, rows: List[T]):
+        pass
+
+    def add(self, row: T) -> asyncio.Future:
+        """
+        Ставит строку в очередь на запись. Возвращает future, который завершается после записи пачки.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_batch_size:
+            # Запись идет в своей сессии, а не в сессии обработчика, который добавил строку
+            asyncio.create_task(self.flush(), context=contextvars.Context())
+        return future
+
+    async def flush(self):
+        async with self._lock:
+            while self._pending:
+                batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+                self._writing = batch
+                try:
+                    await self.write_batch(batch)
+                finally:
+                    self._writing = []
+
+    async def write_batch(self, batch: List[Tuple[T, asyncio.Future]]):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                # Запись всегда идет в своей сессии, а не в сессии обработчика, который вызвал flush:
+                # после ошибки сессия обработчика осталась бы в состоянии, требующем отката
+                await asyncio.create_task(self.write([row for row, _ in batch]), context=contextvars.Context())
+            except (IntegrityError, DataError) as e:
+                if len(batch) == 1:
+                    logger.error("Error to write row, dropping it", exc_info=e)
+                    return self.fail(batch, e)
+                middle = len(batch) // 2
+                await self.write_batch(batch[:middle])
+                await self.write_batch(batch[middle:])
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Error to write batch of {len(batch)} rows after {attempt} attempts", exc_info=e)
+                    return self.fail(batch, e)
+                logger.warning(f"Error to write batch of {len(batch)} rows, attempt {attempt}", exc_info=e)
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+                return
+
+    @staticmethod
+    def fail(batch: List[Tuple[T, asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+                # Ошибка уже залогирована, не все вызывающие ждут результат записи
+                future.exception()
+
+    def pending(self) -> List[T]:
+        """
+        Строки, которые еще не записаны: в очереди и в записываемой сейчас пачке.
+        """
+        return [row for row, _ in self._writing + self._pending]
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+class UserWriter(BatchWriter[Dict[str, Any]]):
+    """
+    Отложенный upsert пользователей: в базу уходят только новые пользователи и изменившиеся данные.
+    """
+
+    def __init__(
+            self, repository: UserRepository, max_known_users: int, max_batch_size: int, flush_interval: float,
+            max_attempts: int = 5, retry_delay: float = 0.2
+    ):
+        super().__init__(
+            max_batch_size=max_batch_size, flush_interval=flush_interval, max_attempts=max_attempts,
+            retry_delay=retry_delay
+        )
+        self.repository = repository
+        self.known_users: TTLCache[Tuple[str, str]] = TTLCache(maxsize=max_known_users, ttl=float("inf"))
+
+    def upsert(self, user: User) -> asyncio.Future:
+        if self.known_users.get(user.id) == (user.username, user.full_name):
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+
+        self.known_users.set(user.id, (user.username, user.full_name))
+        return self.add({"id": user.id, "username": user.username, "full_name": user.full_name})
+
+    async def write(self, rows: List[Dict[str, Any]]):
+        try:
+            with stage_duration.time(stage="user_upsert"):
+                await self.repository.upsert_many(rows)
+        except Exception:
+            for row in rows:
+                self.known_users.pop(row["id"])
+            raise
+
+
+class UserPeerMessageWriter(BatchWriter[UserPeerMessage]):
+    """
+    Пакетная вставка сообщений: одна транзакция и один многострочный INSERT на пачку.
+    """
+
+    def __init__(
+            self, repository: UserPeerMessageRepository, max_batch_size: int, flush_interval: float,
+            max_attempts: int = 5, retry_delay: float = 0.2
+    ):
+        super().__init__(
+            max_batch_size=max_batch_size, flush_interval=flush_interval, max_attempts=max_attempts,
+            retry_delay=retry_delay
+        )
+        self.repository = repository
+
+    async def write(self, rows: List[UserPeerMessage]):
+        with stage_duration.time(stage="save_message"):
+            await self.repository.create_many(rows)
+
+    def get_pending_filepaths(self) -> Set[str]:
+        return {row.filepath for row in self.pending() if row.filepath}
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from app.config import settings
+from app.ordering import get_order_key
+from app.utils.tasks import KeyedSerialExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateJournal:
+    """
+    Журнал апдейтов на SQLite: апдейт подтверждается сразу после записи на диск,
+    обрабатывается позже и удаляется после обработки. После перезапуска необработанные апдейты проигрываются заново.
+    """
+
+    def __init__(self, path: str):
+        # WAL с synchronous=NORMAL переживает падение процесса без fsync на каждую запись
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS updates ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._lock = threading.Lock()
+        self.new_updates = asyncio.Event()
+        # Апдейты, ожидающие записи, в порядке вызова append. Пишет их одна задача, иначе потоки пула
+        # вставляли бы строки в произвольном порядке и id разошелся бы с порядком поступления
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._writing: Optional[asyncio.Task] = None
+
+    def _execute(self, query: str, *parameters: Any) -> List[Tuple]:
+        with self._lock:
+            return self.connection.execute(query, parameters).fetchall()
+
+    def _insert(self, payloads: List[str]):
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(
+                    "INSERT INTO updates (payload) VALUES (?)", [(payload,) for payload in payloads]
+                )
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def submit(self, update: Update) -> asyncio.Future:
+        """
+        Ставит апдейт в очередь на запись. Порядок строк совпадает с порядком вызовов.
+        Возвращает future, который завершается после записи на диск.
+        """
+        payload = update.model_dump_json(by_alias=True, exclude_none=True)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if not self._writing or self._writing.done():
+            self._writing = asyncio.create_task(self.write_pending())
+        return future
+
+    async def append(self, update: Update):
+        await self.submit(update)
+
+    async def join(self):
+        """
+        Дожидается записи всех поставленных в очередь апдейтов.
+        """
+        if self._writing:
+            await asyncio.wait([self._writing])
+
+    async def write_pending(self):
+        # Все накопившиеся апдейты пишутся одной транзакцией
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._insert, [payload for payload, _ in batch])
+            except Exception as e:
+                logger.error(f"Error to journal {len(batch)} updates", exc_info=e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                        future.exception()
+                continue
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+            self.new_updates.set()
+
+    async def fetch(self, limit: int, exclude: Set[int]) -> List[Tuple[int, Dict[str, Any], int]]:
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT id, payload, attempts FROM updates ORDER BY id LIMIT ?", limit + len(exclude)
+        )
+        return [(row_id, json.loads(payload), attempts) for row_id, payload, attempts in rows if row_id not in exclude]
+
+    async def ack(self, row_id: int):
+        await asyncio.to_thread(self._execute, "DELETE FROM updates WHERE id = ?", row_id)
+
+    async def retry(self, row_id: int):
+        await asyncio.to_thread(self._execute, "UPDATE updates SET attempts = attempts + 1 WHERE id = ?", row_id)
+
+    async def size(self) -> int:
+        return (await asyncio.to_thread(self._execute, "SELECT count(*) FROM updates"))[0][0]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class JournalMiddleware(BaseMiddleware):
+    """
+    Внешний middleware: новые апдейты записываются в журнал вместо немедленной обработки.
+    """
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        if data.get("from_journal"):
+            return await handler(event, data)
+        await self.journal.append(event)
+
+
+class JournalConsumer:
+    """
+    Читает журнал по порядку и обрабатывает апдейты: одного ключа последовательно, разных ключей конкурентно.
+    """
+
+    def __init__(
+            self, journal: UpdateJournal, dp: Dispatcher, bot: Bot, max_in_flight: int, max_attempts: int,
+            executor: Optional[KeyedSerialExecutor] = None
+    ):
+        self.journal = journal
+        self.dp = dp
+        self.bot = bot
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.executor = executor or KeyedSerialExecutor()
+        self.in_flight: Set[int] = set()
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def process(self, row_id: int, raw_update: Dict[str, Any], attempts: int):
+        try:
+            update = Update.model_validate(raw_update, context={"bot": self.bot})
+            while True:
+                try:
+                    await self.dp.feed_update(self.bot, update, from_journal=True)
+                    break
+                except Exception as e:
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        logger.error(f"Dropping update {update.update_id} after {attempts} attempts", exc_info=e)
+                        break
+                    # Повтор внутри задачи сохраняет порядок: следующие апдейты этого ключа ждут
+                    logger.warning(f"Error to process update {update.update_id}, attempt {attempts}", exc_info=e)
+                    await self.journal.retry(row_id)
+                    await asyncio.sleep(min(2 ** attempts, 60))
+            await self.journal.ack(row_id)
+        finally:
+            self.in_flight.discard(row_id)
+            self._slots.release()
+
+    async def run(self):
+        logger.info(f"Replaying {await self.journal.size()} journaled updates")
+        while True:
+            self.journal.new_updates.clear()
+            rows = await self.journal.fetch(self.max_in_flight, self.in_flight)
+            for row_id, raw_update, attempts in rows:
+                await self._slots.acquire()
+                self.in_flight.add(row_id)
+                key: Optional[Hashable] = get_order_key(Update.model_validate(raw_update))
+                self.executor.submit(
+                    key, lambda row_id=row_id, raw_update=raw_update, attempts=attempts: self.process(
+                        row_id, raw_update, attempts
+                    )
+                )
+            if not rows:
+                await self.journal.new_updates.wait()
+
+
+def setup_journal(
+        dp: Dispatcher, bot: Bot, path: str, executor: Optional[KeyedSerialExecutor] = None
+) -> JournalConsumer:
+    journal = UpdateJournal(path)
+    dp.update.outer_middleware(JournalMiddleware(journal))
+    consumer = JournalConsumer(
+        journal, dp, bot, max_in_flight=settings.JOURNAL_MAX_IN_FLIGHT, max_attempts=settings.JOURNAL_MAX_ATTEMPTS,
+        executor=executor
+    )
+    asyncio.create_task(consumer.run())
+    dp.shutdown.register(journal.close)
+    return consumer
@@ -1,15 +1,141 @@
 from aiogram import Dispatcher, Bot
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer, PRODUCTION
 from aiogram.enums import ParseMode
+from aiogram.types import BusinessConnection
 
 from app.config import settings
 from app.database.repositories import UserRepository, UserPeerMessageRepository
+from app.database.session import UnitOfWorkMiddleware
+from app.database.writers import UserWriter, UserPeerMessageWriter
+from app.utils.cache import TTLCache
+from app.utils.downloads import DownloadPool
+from app.utils.recent_messages import RecentMessages
+from app.utils.metrics import (
+    outbound_waiting, outbound_wait_seconds, outbound_sent, outbound_retried, outbound_chats,
+    business_connection_cache_size, business_connection_cache_hits, business_connection_cache_misses,
+    business_connection_cache_hit_ratio, recent_messages_cache_size, recent_messages_cache_bytes,
+    recent_messages_cache_hits, recent_messages_cache_misses, recent_messages_cache_hit_ratio, storage_hot_bytes,
+    storage_hot_files, storage_hot_evictions, ordering_keys, ordering_running_keys, ordering_queued_updates,
+    ordering_max_queue_depth
+)
+from app.utils.s3 import S3Storage
 from app.utils.storage import Storage, FileSystemStorage
+from app.utils.tasks import KeyedSerialExecutor
+from app.utils.throttling import OutboundScheduler
+from app.utils.tiered import TieredStorage
 
-bot = Bot(token=settings.TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+bot = Bot(
+    token=settings.TOKEN,
+    session=AiohttpSession(
+        api=TelegramAPIServer.from_base(settings.BOT_API_URL) if settings.BOT_API_URL else PRODUCTION
+    ),
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+)
 dp = Dispatcher()
+dp.update.middleware(UnitOfWorkMiddleware())
 
-storage: Storage = FileSystemStorage()
+outbound_scheduler = OutboundScheduler(
+    global_rate=settings.OUTBOUND_GLOBAL_RATE,
+    chat_rate=settings.OUTBOUND_CHAT_RATE,
+    chat_burst=settings.OUTBOUND_CHAT_BURST,
+    max_retries=settings.OUTBOUND_MAX_RETRIES
+)
+bot.session.middleware(outbound_scheduler)
+outbound_waiting.set_function(lambda: outbound_scheduler.waiting)
+outbound_wait_seconds.set_function(lambda: outbound_scheduler.wait_seconds)
+outbound_sent.set_function(lambda: outbound_scheduler.sent)
+outbound_retried.set_function(lambda: outbound_scheduler.retried)
+outbound_chats.set_function(lambda: len(outbound_scheduler.chat_buckets))
+
+update_executor = KeyedSerialExecutor(max_running=settings.ORDERING_MAX_RUNNING_KEYS)
+ordering_keys.set_function(lambda: update_executor.stats()["keys"])
+ordering_running_keys.set_function(lambda: update_executor.running)
+ordering_queued_updates.set_function(lambda: update_executor.stats()["queued"])
+ordering_max_queue_depth.set_function(lambda: update_executor.stats()["max_depth"])
+
+
+
+def create_filesystem_storage(root: str) -> FileSystemStorage:
+    return FileSystemStorage(
+        root, delete_concurrency=settings.STORAGE_DELETE_CONCURRENCY, chunk_size=settings.STORAGE_CHUNK_SIZE
+    )
+
+
+def create_s3_storage() -> S3Storage:
+    return S3Storage(
+        endpoint_url=settings.S3_ENDPOINT_URL,
+        bucket=settings.S3_BUCKET,
+        access_key=settings.S3_ACCESS_KEY,
+        secret_key=settings.S3_SECRET_KEY,
+        region=settings.S3_REGION,
+        prefix=settings.S3_PREFIX,
+        max_connections=settings.S3_MAX_CONNECTIONS,
+        part_size=settings.S3_PART_SIZE,
+        delete_concurrency=settings.STORAGE_DELETE_CONCURRENCY,
+        chunk_size=settings.STORAGE_CHUNK_SIZE
+    )
+
+
+if settings.STORAGE_BACKEND == "s3":
+    storage: Storage = create_s3_storage()
+elif settings.STORAGE_BACKEND == "tiered":
+    storage = TieredStorage(
+        hot=create_filesystem_storage(settings.CACHE_DIR),
+        cold=create_filesystem_storage(settings.COLD_STORAGE_DIR) if settings.COLD_STORAGE_DIR else create_s3_storage(),
+        max_bytes=settings.HOT_STORAGE_MAX_BYTES
+    )
+    storage_hot_bytes.set_function(lambda: storage.hot_bytes)
+    storage_hot_files.set_function(lambda: storage.hot_files)
+    storage_hot_evictions.set_function(lambda: storage.evictions)
+else:
+    storage = create_filesystem_storage(settings.CACHE_DIR)
 
 user_repository = UserRepository()
 user_peer_message_repository = UserPeerMessageRepository()
+
+user_writer = UserWriter(
+    user_repository,
+    max_known_users=settings.KNOWN_USERS_CACHE_SIZE,
+    max_batch_size=settings.USER_WRITER_BATCH_SIZE,
+    flush_interval=settings.USER_WRITER_FLUSH_MILLISECONDS / 1000,
+    max_attempts=settings.WRITER_MAX_ATTEMPTS,
+    retry_delay=settings.WRITER_RETRY_MILLISECONDS / 1000
+)
+
+user_peer_message_writer = UserPeerMessageWriter(
+    user_peer_message_repository,
+    max_batch_size=settings.MESSAGE_WRITER_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_WRITER_FLUSH_MILLISECONDS / 1000,
+    max_attempts=settings.WRITER_MAX_ATTEMPTS,
+    retry_delay=settings.WRITER_RETRY_MILLISECONDS / 1000
+)
+
+download_pool = DownloadPool(
+    bot, user_peer_message_repository, storage,
+    workers=settings.DOWNLOAD_WORKERS, queue_size=settings.DOWNLOAD_QUEUE_SIZE
+)
+
+business_connection_cache: TTLCache[BusinessConnection] = TTLCache(
+    maxsize=settings.BUSINESS_CONNECTION_CACHE_SIZE, ttl=settings.BUSINESS_CONNECTION_CACHE_TTL
+)
+business_connection_cache_size.set_function(lambda: len(business_connection_cache))
+business_connection_cache_hits.set_function(lambda: business_connection_cache.hits)
+business_connection_cache_misses.set_function(lambda: business_connection_cache.misses)
+business_connection_cache_hit_ratio.set_function(lambda: business_connection_cache.stats()["hit_ratio"])
+
+uploaded_file_id_cache: TTLCache[str] = TTLCache(
+    maxsize=settings.UPLOADED_FILE_ID_CACHE_SIZE, ttl=settings.UPLOADED_FILE_ID_CACHE_TTL
+)
+
+recent_messages = RecentMessages(
+    maxsize=settings.RECENT_MESSAGES_CACHE_SIZE,
+    ttl=settings.RECENT_MESSAGES_CACHE_TTL,
+    max_bytes=settings.RECENT_MESSAGES_CACHE_MAX_BYTES
+)
+recent_messages_cache_size.set_function(lambda: len(recent_messages.cache))
+recent_messages_cache_bytes.set_function(lambda: recent_messages.cache.weight)
+recent_messages_cache_hits.set_function(lambda: recent_messages.cache.hits)
+recent_messages_cache_misses.set_function(lambda: recent_messages.cache.misses)
+recent_messages_cache_hit_ratio.set_function(lambda: recent_messages.stats()["hit_ratio"])
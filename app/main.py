@@ -1,24 +1,63 @@
 import asyncio
 import logging
 import sys
+from datetime import datetime, timedelta
 
-from app.controller.business_message import router as business_message_router
-from app.controller.private import router as private_router
-from app.loader import dp, bot
+from app.config import settings
+from app.controller import setup_routers
+from app.journal import setup_journal
+from app.loader import dp, bot, user_writer, user_peer_message_writer, download_pool, storage, update_executor
+from app.ordering import OrderingMiddleware
+from app.sharding import ShardedWorkers, ShardingMiddleware
 from app.utils.content import cron_delete_messages
+from app.utils.digest import deletion_digest
+from app.utils.metrics import run_metrics_server
+from app.webhook import run_webhook
 
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
 
 async def main() -> None:
-    dp.include_router(business_message_router)
-    dp.include_router(private_router)
-    await dp.start_polling(bot)
+    # Роутеры подключаются и в процессе-приемнике, чтобы правильно определить allowed_updates
+    setup_routers(dp)
+
+    metrics_runner = None
+    if settings.METRICS_PORT:
+        metrics_runner = await run_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+
+    workers = None
+    if settings.WORKERS:
+        workers = ShardedWorkers(settings.WORKERS)
+        workers.start()
+        dp.update.outer_middleware(ShardingMiddleware(workers))
+    elif settings.JOURNAL_PATH:
+        setup_journal(dp, bot, settings.JOURNAL_PATH, update_executor)
+    else:
+        dp.update.outer_middleware(OrderingMiddleware(update_executor))
+
+    try:
+        if settings.UPDATES_MODE == "webhook":
+            await run_webhook()
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await deletion_digest.close()
+        await user_writer.flush()
+        await user_peer_message_writer.flush()
+        if workers:
+            await workers.stop()
+        await storage.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
     loop = asyncio.new_event_loop()
 
     loop.create_task(cron_delete_messages())
-    loop.create_task(main())
+    loop.create_task(user_writer.run())
+    loop.create_task(user_peer_message_writer.run())
+    loop.create_task(download_pool.run())
+    loop.create_task(download_pool.resume(since=datetime.now() - timedelta(days=settings.DOWNLOAD_RESUME_DAYS)))
+    loop.create_task(main()).add_done_callback(lambda _: loop.stop())
     loop.run_forever()
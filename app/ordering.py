@@ -0,0 +1,66 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.utils.metrics import stage_duration
+from app.utils.tasks import KeyedSerialExecutor
+
+
+def get_order_key(update: Update) -> Optional[Hashable]:
+    """
+    Ключ порядка обработки: чат внутри бизнес-подключения, иначе отправитель.
+    Мельче ключа шардирования: разные чаты одного владельца обрабатываются параллельно.
+    """
+    if update.business_connection:
+        return update.business_connection.id
+
+    for message in (update.business_message, update.edited_business_message, update.deleted_business_messages):
+        if message:
+            return message.business_connection_id, message.chat.id
+
+    if update.message and update.message.from_user:
+        return update.message.from_user.id
+
+
+class OrderingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware: апдейты одного чата передаются обработчикам в порядке поступления, разных чатов - конкурентно.
+    Без него правка или удаление может обогнать сохранение исходного сообщения.
+    """
+
+    def __init__(self, executor: KeyedSerialExecutor):
+        self.executor = executor
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        key = get_order_key(event)
+        if key is None:
+            return await handler(event, data)
+
+        result = asyncio.get_running_loop().create_future()
+        queued_at = time.perf_counter()
+
+        async def run():
+            stage_duration.observe(time.perf_counter() - queued_at, stage="ordering_wait")
+            try:
+                value = await handler(event, data)
+                if not result.done():
+                    result.set_result(value)
+            except Exception as e:
+                # Ошибка возвращается вызывающему (вебхук, журнал), а не логируется исполнителем
+                if not result.done():
+                    result.set_exception(e)
+            finally:
+                if not result.done():
+                    result.cancel()
+
+        # Постановка в очередь происходит до первого await, поэтому порядок совпадает с порядком поступления
+        self.executor.submit(key, run)
+        return await result
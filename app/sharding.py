@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+
+def get_shard_key(update: Update) -> Optional[str]:
+    """
+    Ключ шардирования: бизнес-подключение (одно на владельца), иначе отправитель.
+    Все апдейты одного владельца попадают в один воркер, внутри воркера порядок держится по чатам (get_order_key).
+    """
+    if update.business_connection:
+        return update.business_connection.id
+
+    for message in (update.business_message, update.edited_business_message, update.deleted_business_messages):
+        if message:
+            return message.business_connection_id
+
+    if update.message and update.message.from_user:
+        return str(update.message.from_user.id)
+
+
+class ShardedWorkers:
+    """
+    Пул процессов-воркеров, каждый из которых обрабатывает апдейты своего шарда своими роутерами.
+    """
+
+    def __init__(self, workers: int, check_interval: float = 1.0):
+        self.workers = workers
+        self.check_interval = check_interval
+        self.context = multiprocessing.get_context("spawn")
+        self.queues: List[multiprocessing.Queue] = []
+        self.processes: List[multiprocessing.Process] = []
+        self._supervisor: Optional[asyncio.Task] = None
+
+    def start_worker(self, index: int) -> Tuple[multiprocessing.Queue, multiprocessing.Process]:
+        queue = self.context.Queue()
+        process = self.context.Process(target=run_worker, args=(index, queue), name=f"worker-{index}", daemon=True)
+        process.start()
+        return queue, process
+
+    def start(self):
+        for index in range(self.workers):
+            queue, process = self.start_worker(index)
+            self.queues.append(queue)
+            self.processes.append(process)
+        self._supervisor = asyncio.create_task(self.supervise())
+        logger.info(f"Started {self.workers} update workers")
+
+    async def supervise(self):
+        """
+        Перезапускает упавшие воркеры, иначе апдейты их шарда молча пропадали бы.
+        """
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+
+                # Очередь могла остаться в несогласованном состоянии, если воркер упал во время чтения из нее
+                queue = self.queues[index]
+                try:
+                    lost = queue.qsize()
+                except NotImplementedError:
+                    lost = "unknown number of"
+                queue.cancel_join_thread()
+                queue.close()
+                logger.error(
+                    f"Worker {index} exited with code {process.exitcode}, restarting it. "
+                    f"Lost {lost} queued updates (journaled updates are replayed by the new worker)"
+                )
+                self.queues[index], self.processes[index] = self.start_worker(index)
+
+    def dispatch(self, update: Update):
+        key = get_shard_key(update) or str(update.update_id)
+        # crc32 стабилен между процессами, в отличие от hash()
+        shard = zlib.crc32(key.encode()) % self.workers
+        self.queues[shard].put(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+    async def stop(self):
+        if self._supervisor:
+            self._supervisor.cancel()
+        for queue in self.queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join)
+
+
+class ShardingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware процесса-приемника: передает апдейт воркеру вместо локальной обработки.
+    """
+
+    def __init__(self, workers: ShardedWorkers):
+        self.workers = workers
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        self.workers.dispatch(event)
+
+
+def run_worker(index: int, queue: multiprocessing.Queue):
+    # Остановкой воркеров управляет процесс-приемник
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(worker_main(index, queue))
+
+
+async def worker_main(index: int, queue: multiprocessing.Queue):
+    from app.config import settings
+    from app.controller import setup_routers
+    from app.journal import setup_journal
+    from app.loader import bot, dp, download_pool, user_writer, user_peer_message_writer, storage, update_executor
+    from app.ordering import get_order_key
+    from app.utils.digest import deletion_digest
+    from app.utils.metrics import run_metrics_server
+
+    setup_routers(dp)
+    journal = None
+    if settings.JOURNAL_PATH:
+        journal = setup_journal(dp, bot, f"{settings.JOURNAL_PATH}.{index}", update_executor).journal
+    metrics_runner = None
+    if settings.METRICS_PORT:
+        metrics_runner = await run_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + 1 + index)
+    background = [
+        asyncio.create_task(user_writer.run()),
+        asyncio.create_task(user_peer_message_writer.run()),
+        asyncio.create_task(download_pool.run())
+    ]
+    loop = asyncio.get_running_loop()
+    logger.info(f"Worker {index} started")
+
+    try:
+        while (raw_update := await loop.run_in_executor(None, queue.get)) is not None:
+            update = Update.model_validate(raw_update, context={"bot": bot})
+            if journal:
+                # Запись в журнал не ждет обработки предыдущих апдейтов ключа: update_executor занят только
+                # обработкой, которую ведет потребитель журнала
+                journal.submit(update)
+            else:
+                update_executor.submit(get_order_key(update), lambda update=update: dp.feed_update(bot, update))
+        if journal:
+            await journal.join()
+        await update_executor.join()
+    finally:
+        await deletion_digest.close()
+        await user_writer.flush()
+        await user_peer_message_writer.flush()
+        for task in background:
+            task.cancel()
+        await bot.session.close()
+        await storage.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        logger.info(f"Worker {index} stopped")
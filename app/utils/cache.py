@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Ограниченный по размеру кэш с временем жизни записей и счетчиками попаданий/промахов.
+    Помимо количества записей можно ограничить суммарный вес (например, байты), задав max_weight и weigher.
+    """
+
+    def __init__(
+            self, maxsize: int, ttl: float, max_weight: Optional[int] = None, weigher: Optional[Callable[[V], int]] = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+
+    def get(self, key: Hashable) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V):
+        self.pop(key)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        if self.weigher:
+            self._weights[key] = self.weigher(value)
+            self.weight += self._weights[key]
+
+        while len(self._data) > self.maxsize or (self.max_weight is not None and self.weight > self.max_weight):
+            self.pop(next(iter(self._data)))
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        item = self._data.pop(key, None)
+        self.weight -= self._weights.pop(key, 0)
+        return item[1] if item else None
+
+    def clear(self):
+        self._data.clear()
+        self._weights.clear()
+        self.weight = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] >= time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
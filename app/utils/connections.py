@@ -0,0 +1,27 @@
+import logging
+
+from aiogram.types import BusinessConnection
+
+from app.loader import bot, business_connection_cache
+from app.utils.metrics import stage_duration
+
+logger = logging.getLogger(__name__)
+
+
+async def get_business_connection(business_connection_id: str) -> BusinessConnection:
+    with stage_duration.time(stage="get_business_connection"):
+        if business_connection := business_connection_cache.get(business_connection_id):
+            return business_connection
+
+        business_connection = await bot.get_business_connection(business_connection_id)
+        business_connection_cache.set(business_connection_id, business_connection)
+        return business_connection
+
+
+def update_business_connection(business_connection: BusinessConnection):
+    if business_connection.is_enabled:
+        business_connection_cache.set(business_connection.id, business_connection)
+    else:
+        business_connection_cache.pop(business_connection.id)
+
+    logger.info(f"Business connection {business_connection.id} updated, cache stats: {business_connection_cache.stats()}")
@@ -1,19 +1,25 @@
 import asyncio
+import html
 import logging
-import os
+import time
 from datetime import datetime, timedelta
 from mimetypes import MimeTypes
-from typing import Union, Optional
+from typing import Union, Optional, List, Set, Tuple
 
-from aiogram.types import Message, ContentType, BusinessConnection, FSInputFile, InputMediaAudio, InputMediaDocument, \
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, ContentType, BusinessConnection, InputFile, InputMediaAudio, InputMediaDocument, \
     InputMediaPhoto, InputMediaVideo, InlineKeyboardMarkup, Chat
 
 from app.config import settings
-from app.database.models import UserPeerMessage, User
-from app.loader import bot, user_peer_message_repository, storage
+from app.database.models import UserPeerMessage, User, FileState
+from app.loader import bot, user_peer_message_repository, user_peer_message_writer, storage, download_pool, \
+    uploaded_file_id_cache, recent_messages
 from app.utils.markups import user_link_markup
+from app.utils.metrics import retention_deleted_messages, retention_freed_bytes
 from app.utils.patterns import EDIT_MESSAGE_TEXT, BEFORE_EDIT_MESSAGE_TEXT, AFTER_EDIT_MESSAGE_TEXT, \
-    DELETE_MESSAGE_TEXT, DELETE_VIDEO_NOTE_MESSAGE_TEXT
+    DELETE_MESSAGE_TEXT, DELETE_VIDEO_NOTE_MESSAGE_TEXT, DELETE_MESSAGES_DIGEST_TEXT, DELETE_MESSAGES_DIGEST_ITEM_TEXT, \
+    DELETE_MESSAGES_ALBUM_TEXT
+from app.utils.tiered import TieredStorage
 
 logger = logging.getLogger(__name__)
 
@@ -38,13 +44,35 @@ NOTE_TYPES = (
     ContentType.VOICE,
 )
 
-
-async def save_message(message: Message, business_connection: BusinessConnection) -> UserPeerMessage:
+InputFileOrId = Union[str, InputFile]
+
+MESSAGE_MAX_LENGTH = 4096
+MEDIA_GROUP_MAX_SIZE = 10
+
+# Поля Message, которые сохраняются в базе. Текст и файлы хранятся в отдельных колонках,
+# полная копия сообщения со всеми вложенными объектами при каждой правке не нужна
+MESSAGE_PAYLOAD_FIELDS = {
+    "message_id": True,
+    "date": True,
+    "edit_date": True,
+    "media_group_id": True,
+    "has_protected_content": True,
+    "chat": {"id"},
+    "from_user": {"id"},
+    "reply_to_message": {"message_id"},
+    "entities": True,
+    "caption_entities": True,
+}
+
+
+async def save_message(
+        message: Message, business_connection: BusinessConnection, wait_content: bool = False
+) -> UserPeerMessage:
     user_peer_message = UserPeerMessage(
         user_id=business_connection.user.id,
         chat_id=message.chat.id,
         message_id=message.message_id,
-        message=message.model_dump_json(exclude_none=True),
+        message=get_message_payload(message),
         text=message.text or message.caption,
         type=message.content_type,
         created_at=message.date.date(),
@@ -52,77 +80,107 @@ async def save_message(message: Message, business_connection: BusinessConnection
     )
 
     if message_has_content(message):
-        path_to_files = create_content_dir(
-            user_id=business_connection.user.id, chat_id=message.chat.id, message_id=message.message_id,
-            date=int(datetime.now().timestamp())
-        )
-        user_peer_message = await download_message_content(user_peer_message, message, path_to_files)
+        user_peer_message = set_message_content(user_peer_message, message)
 
-    return await user_peer_message_repository.create(user_peer_message)
+    saved = user_peer_message_writer.add(user_peer_message)
+    recent_messages.remember(user_peer_message)
 
+    download = None
+    if user_peer_message.file_state == FileState.PENDING:
+        # Загрузка идет параллельно со вставкой, статус файла обновляется после нее
+        download = await download_pool.submit(user_peer_message, saved)
+
+    # Обработчик завершается только после записи строки: иначе журнал подтвердит апдейт до сохранения,
+    # а ошибка записи не дойдет до повтора апдейта
+    await saved
+    if download and wait_content:
+        await download
+
+    return user_peer_message
+
+
+async def get_last_message(user_id: int, chat_id: int, message_id: int) -> Optional[UserPeerMessage]:
+    if user_peer_message := recent_messages.get(user_id, chat_id, message_id):
+        return user_peer_message
+
+    # Сообщение могло быть принято только что и еще не записано
+    await user_peer_message_writer.flush()
+    return await user_peer_message_repository.get_last_message(
+        user_id=user_id, chat_id=chat_id, message_id=message_id, since=get_retention_date()
+    )
+
+
+async def get_last_messages(user_id: int, chat_id: int, message_ids: List[int]) -> List[UserPeerMessage]:
+    user_peer_messages, missing_ids = [], []
+    for message_id in message_ids:
+        if user_peer_message := recent_messages.get(user_id, chat_id, message_id):
+            user_peer_messages.append(user_peer_message)
+        else:
+            missing_ids.append(message_id)
+
+    if missing_ids:
+        await user_peer_message_writer.flush()
+        user_peer_messages.extend(
+            await user_peer_message_repository.get_last_messages(
+                user_id=user_id, chat_id=chat_id, message_ids=missing_ids, since=get_retention_date()
+            )
+        )
+    return user_peer_messages
 
-def message_has_content(message: Message):
-    return True if message.content_type in MEDIA_TYPES else False
 
+def get_retention_date() -> datetime:
+    """
+    Граница срока хранения: более старые сообщения удаляются, искать их и сканировать их секции не нужно.
+    """
+    return datetime.now() - timedelta(days=settings.DAYS_TO_SAVE_CONTENT)
 
-def create_content_dir(user_id: int, chat_id: int, message_id: int, date: int) -> str:
-    user_dir = os.path.join(settings.CACHE_DIR, str(user_id))
-    chat_dir = os.path.join(user_dir, str(chat_id))
-    message_dir = os.path.join(chat_dir, str(message_id))
-    message_iter_dir = os.path.join(message_dir, str(date))
 
-    if not os.path.exists(settings.CACHE_DIR):
-        os.mkdir(settings.CACHE_DIR)
-    if not os.path.exists(user_dir):
-        os.mkdir(user_dir)
-    if not os.path.exists(chat_dir):
-        os.mkdir(chat_dir)
-    if not os.path.exists(message_dir):
-        os.mkdir(message_dir)
-    if not os.path.exists(message_iter_dir):
-        os.mkdir(message_iter_dir)
+def get_message_payload(message: Message) -> dict:
+    return message.model_dump(mode="json", by_alias=True, exclude_none=True, include=MESSAGE_PAYLOAD_FIELDS)
 
-    return message_iter_dir
+
+def message_has_content(message: Message):
+    return True if message.content_type in MEDIA_TYPES else False
 
 
-async def download_message_content(user_peer_message: UserPeerMessage, message: Message, path: str) -> UserPeerMessage:
+def set_message_content(user_peer_message: UserPeerMessage, message: Message) -> UserPeerMessage:
     if message.audio:
         user_peer_message.file_id = message.audio.file_id
         user_peer_message.filename = message.audio.file_name
         user_peer_message.mimetype = message.audio.mime_type
-        user_peer_message.filepath = os.path.join(path, user_peer_message.filename)
+        user_peer_message.filepath = storage.content_key(message.audio.file_unique_id, user_peer_message.filename)
 
     if message.document:
         user_peer_message.file_id = message.document.file_id
         user_peer_message.filename = message.document.file_name
         user_peer_message.mimetype = message.document.mime_type
-        user_peer_message.filepath = os.path.join(path, user_peer_message.filename)
+        user_peer_message.filepath = storage.content_key(message.document.file_unique_id, user_peer_message.filename)
 
     if message.photo:
         user_peer_message.file_id = message.photo[-1].file_id
         user_peer_message.filename = get_filename(message.photo[-1].file_id, "image/jpeg")
         user_peer_message.mimetype = "image/jpeg"
-        user_peer_message.filepath = os.path.join(path, user_peer_message.filename)
+        user_peer_message.filepath = storage.content_key(message.photo[-1].file_unique_id, user_peer_message.filename)
 
     if message.video:
         user_peer_message.file_id = message.video.file_id
         user_peer_message.filename = message.video.file_name
         user_peer_message.mimetype = message.video.mime_type
-        user_peer_message.filepath = os.path.join(path, user_peer_message.filename)
+        user_peer_message.filepath = storage.content_key(message.video.file_unique_id, user_peer_message.filename)
 
     if message.video_note:
         user_peer_message.file_id = message.video_note.file_id
         user_peer_message.filename = get_filename(message.video_note.file_id, "video/mp4")
         user_peer_message.mimetype = "video/mp4"
-        user_peer_message.filepath = os.path.join(path, user_peer_message.filename)
+        user_peer_message.filepath = storage.content_key(message.video_note.file_unique_id, user_peer_message.filename)
 
     if message.voice:
         user_peer_message.file_id = message.voice.file_id
         user_peer_message.filename = get_filename(message.voice.file_id, message.voice.mime_type)
         user_peer_message.mimetype = message.voice.mime_type
-        user_peer_message.filepath = os.path.join(path, user_peer_message.filename)
+        user_peer_message.filepath = storage.content_key(message.voice.file_unique_id, user_peer_message.filename)
 
-    await bot.download(file=user_peer_message.file_id, destination=user_peer_message.filepath)
+    user_peer_message.file_state = FileState.PENDING
 
     return user_peer_message
 
@@ -135,29 +193,47 @@ def get_filename(
     return file_id + extension
 
 
-def create_input_media(user_peer_message: UserPeerMessage, text_pattern: str) -> Union[
+def create_input_media(user_peer_message: UserPeerMessage, text_pattern: str, file: InputFileOrId) -> Union[
     InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
 ]:
     text = text_pattern.format(text=user_peer_message.text)
     if user_peer_message.type == ContentType.AUDIO:
-        return InputMediaAudio(
-            media=FSInputFile(user_peer_message.filepath, user_peer_message.filename), caption=text
-        )
+        return InputMediaAudio(media=file, caption=text)
 
     if user_peer_message.type == ContentType.DOCUMENT:
-        return InputMediaDocument(
-            media=FSInputFile(user_peer_message.filepath, user_peer_message.filename), caption=text
-        )
+        return InputMediaDocument(media=file, caption=text)
 
     if user_peer_message.type == ContentType.PHOTO:
-        return InputMediaPhoto(
-            media=FSInputFile(user_peer_message.filepath, user_peer_message.filename), caption=text
-        )
+        return InputMediaPhoto(media=file, caption=text)
 
     if user_peer_message.type == ContentType.VIDEO:
-        return InputMediaVideo(
-            media=FSInputFile(user_peer_message.filepath, user_peer_message.filename), caption=text
+        return InputMediaVideo(media=file, caption=text)
+
+
+async def send_content_group(
+        chat_id: int, user_peer_messages: List[Tuple[UserPeerMessage, str]]
+) -> List[Message]:
+    try:
+        return await bot.send_media_group(
+            chat_id=chat_id,
+            media=[
+                create_input_media(user_peer_message, text_pattern, get_file_id(user_peer_message))
+                for user_peer_message, text_pattern in user_peer_messages
+            ]
         )
+    except TelegramBadRequest as e:
+        logger.warning(f"File ids rejected, uploading media group from disk: {e}")
+
+    sent_messages = await bot.send_media_group(
+        chat_id=chat_id,
+        media=[
+            create_input_media(user_peer_message, text_pattern, get_input_file(user_peer_message))
+            for user_peer_message, text_pattern in user_peer_messages
+        ]
+    )
+    for (user_peer_message, _), sent_message in zip(user_peer_messages, sent_messages):
+        remember_file_id(user_peer_message, sent_message)
+    return sent_messages
 
 
 async def send_content_with_pattern(
@@ -166,42 +242,81 @@ async def send_content_with_pattern(
     return await send_content(chat_id, user_peer_message, text_pattern.format(text=user_peer_message.text), markup)
 
 
+def get_file_id(user_peer_message: UserPeerMessage) -> str:
+    return uploaded_file_id_cache.get(user_peer_message.file_id) or user_peer_message.file_id
+
+
+def get_input_file(user_peer_message: UserPeerMessage) -> InputFile:
+    return storage.get(user_peer_message.filepath, user_peer_message.filename)
+
+
+def remember_file_id(user_peer_message: UserPeerMessage, sent_message: Message):
+    if file_id := get_message_file_id(sent_message):
+        uploaded_file_id_cache.set(user_peer_message.file_id, file_id)
+
+
+def get_message_file_id(message: Message) -> Optional[str]:
+    if message.photo:
+        return message.photo[-1].file_id
+
+    for file in (message.audio, message.document, message.video, message.video_note, message.voice):
+        if file:
+            return file.file_id
+
+
 async def send_content(
         chat_id: int, user_peer_message: UserPeerMessage, text: Optional[str], markup: InlineKeyboardMarkup
-):
+) -> Optional[Message]:
+    # У текстовых сообщений нет файла, отправлять нечего
+    if user_peer_message.type not in MEDIA_TYPES or not user_peer_message.filepath:
+        return None
+
+    # Повторная отправка по file_id не требует заново загружать файл в Telegram
+    if file_id := get_file_id(user_peer_message):
+        try:
+            return await send_content_file(chat_id, user_peer_message, text, markup, file_id)
+        except TelegramBadRequest as e:
+            logger.warning(f"File id {file_id} rejected, uploading {user_peer_message.filepath} from disk: {e}")
+
+    sent_message = await send_content_file(
+        chat_id, user_peer_message, text, markup, get_input_file(user_peer_message)
+    )
+    remember_file_id(user_peer_message, sent_message)
+    return sent_message
+
+
+async def send_content_file(
+        chat_id: int, user_peer_message: UserPeerMessage, text: Optional[str], markup: InlineKeyboardMarkup,
+        file: InputFileOrId
+) -> Message:
     if user_peer_message.type == ContentType.AUDIO:
-        await bot.send_audio(
-            chat_id=chat_id, audio=FSInputFile(user_peer_message.filepath, user_peer_message.filename),
-            caption=text, reply_markup=markup
+        return await bot.send_audio(
+            chat_id=chat_id, audio=file, caption=text, reply_markup=markup
         )
 
     if user_peer_message.type == ContentType.DOCUMENT:
-        await bot.send_document(
-            chat_id=chat_id, document=FSInputFile(user_peer_message.filepath, user_peer_message.filename),
-            caption=text, reply_markup=markup
+        return await bot.send_document(
+            chat_id=chat_id, document=file, caption=text, reply_markup=markup
         )
 
     if user_peer_message.type == ContentType.PHOTO:
-        await bot.send_photo(
-            chat_id=chat_id, photo=FSInputFile(user_peer_message.filepath),
-            caption=text, reply_markup=markup
+        return await bot.send_photo(
+            chat_id=chat_id, photo=file, caption=text, reply_markup=markup
         )
 
     if user_peer_message.type == ContentType.VIDEO:
-        await bot.send_video(
-            chat_id=chat_id, video=FSInputFile(user_peer_message.filepath, user_peer_message.filename),
-            caption=text, reply_markup=markup
+        return await bot.send_video(
+            chat_id=chat_id, video=file, caption=text, reply_markup=markup
         )
 
     if user_peer_message.type == ContentType.VIDEO_NOTE:
-        await bot.send_video_note(
-            chat_id=chat_id, video_note=FSInputFile(user_peer_message.filepath), reply_markup=markup
+        return await bot.send_video_note(
+            chat_id=chat_id, video_note=file, reply_markup=markup
         )
 
     if user_peer_message.type == ContentType.VOICE:
-        await bot.send_voice(
-            chat_id=chat_id, voice=FSInputFile(user_peer_message.filepath),
-            caption=text, reply_markup=markup
+        return await bot.send_voice(
+            chat_id=chat_id, voice=file, caption=text, reply_markup=markup
         )
 
 
@@ -222,11 +337,11 @@ async def send_message_edited(
             )
 
         elif last_user_peer_message.type in MEDIA_GROUP_TYPES and new_user_user_peer_message.type in MEDIA_GROUP_TYPES:
-            await bot.send_media_group(
-                chat_id=new_user_user_peer_message.user_id,
-                media=[
-                    create_input_media(last_user_peer_message, BEFORE_EDIT_MESSAGE_TEXT),
-                    create_input_media(new_user_user_peer_message, AFTER_EDIT_MESSAGE_TEXT)
+            await send_content_group(
+                new_user_user_peer_message.user_id,
+                [
+                    (last_user_peer_message, BEFORE_EDIT_MESSAGE_TEXT),
+                    (new_user_user_peer_message, AFTER_EDIT_MESSAGE_TEXT)
                 ]
             )
             await bot.send_message(
@@ -304,20 +419,166 @@ async def send_message_deleted(peer: Union[User, Chat], user_peer_message: UserP
         )
 
 
+async def send_messages_deleted(peer: Union[User, Chat], user_peer_messages: List[UserPeerMessage]):
+    """
+    Сводное уведомление о массовом удалении: тексты объединяются в несколько сообщений,
+    медиа отправляются альбомами.
+    """
+    if len(user_peer_messages) == 1:
+        return await send_message_deleted(peer, user_peer_messages[0])
+
+    markup = user_link_markup(peer)
+    user_id = user_peer_messages[0].user_id
+    # Сводка идет в порядке отправки сообщений, message_id в чате возрастает
+    user_peer_messages = sorted(user_peer_messages, key=lambda user_peer_message: user_peer_message.message_id)
+
+    for album in group_media(
+            [user_peer_message for user_peer_message in user_peer_messages if user_peer_message.type in MEDIA_GROUP_TYPES]
+    ):
+        if len(album) == 1:
+            await send_content_with_pattern(user_id, album[0], DELETE_MESSAGE_TEXT, markup)
+        else:
+            sent_messages = await send_content_group(
+                user_id, [(user_peer_message, DELETE_MESSAGE_TEXT) for user_peer_message in album]
+            )
+            # У альбома не бывает кнопок, ссылка на собеседника отправляется ответом на него
+            await bot.send_message(
+                chat_id=user_id, text=DELETE_MESSAGES_ALBUM_TEXT, reply_markup=markup,
+                reply_to_message_id=sent_messages[0].message_id
+            )
+
+    for user_peer_message in user_peer_messages:
+        if user_peer_message.type in MEDIA_TYPES and user_peer_message.type not in MEDIA_GROUP_TYPES:
+            await send_message_deleted(peer, user_peer_message)
+
+    for text in build_deleted_digest(
+            [user_peer_message for user_peer_message in user_peer_messages if user_peer_message.type not in MEDIA_TYPES]
+    ):
+        await bot.send_message(chat_id=user_id, text=text, reply_markup=markup)
+
+
+def group_media(user_peer_messages: List[UserPeerMessage]) -> List[List[UserPeerMessage]]:
+    # Аудио и документы нельзя смешивать в альбоме с другими типами, фото и видео можно
+    groups = {}
+    for user_peer_message in user_peer_messages:
+        kind = ContentType.PHOTO if user_peer_message.type == ContentType.VIDEO else user_peer_message.type
+        groups.setdefault(kind, []).append(user_peer_message)
+
+    return [
+        group[i:i + MEDIA_GROUP_MAX_SIZE]
+        for group in groups.values()
+        for i in range(0, len(group), MEDIA_GROUP_MAX_SIZE)
+    ]
+
+
+def get_text_length(text: str) -> int:
+    """
+    Длина текста так, как ее считает Telegram: в кодовых единицах UTF-16 (эмодзи обычно занимают две).
+    """
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate_text(text: str, length: int) -> str:
+    # Половина суррогатной пары на границе отбрасывается
+    return text.encode("utf-16-le")[:length * 2].decode("utf-16-le", errors="ignore")
+
+
+def build_deleted_digest(user_peer_messages: List[UserPeerMessage]) -> List[str]:
+    overhead = get_text_length(DELETE_MESSAGES_DIGEST_TEXT.format(texts="")) + get_text_length(
+        DELETE_MESSAGES_DIGEST_ITEM_TEXT.format(text="")
+    )
+    digests, items, length = [], [], overhead
+
+    for user_peer_message in user_peer_messages:
+        # Сначала обрезаем, потом экранируем, чтобы не разрезать сущность вроде &amp;.
+        # Неэкранированный < или & в одном тексте сделал бы невалидной всю сводку, и Telegram отверг бы ее целиком
+        text = truncate_text(user_peer_message.text or "", MESSAGE_MAX_LENGTH - overhead)
+        item = DELETE_MESSAGES_DIGEST_ITEM_TEXT.format(text=html.escape(text, quote=False))
+        # Telegram считает длину после разбора разметки, то есть по исходному тексту
+        item_length = get_text_length(DELETE_MESSAGES_DIGEST_ITEM_TEXT.format(text=text))
+        if items and length + item_length + 1 > MESSAGE_MAX_LENGTH:
+            digests.append(DELETE_MESSAGES_DIGEST_TEXT.format(texts="\n".join(items)))
+            items, length = [], overhead
+        items.append(item)
+        length += item_length + 1
+
+    if items:
+        digests.append(DELETE_MESSAGES_DIGEST_TEXT.format(texts="\n".join(items)))
+    return digests
+
+
 async def send_protected_content(peer: Union[User, Chat], protected_peer_message: UserPeerMessage):
     await send_content(protected_peer_message.user_id, protected_peer_message, None, user_link_markup(peer))
 
 
-async def cron_delete_messages():
-    from_date = datetime.now() - timedelta(days=settings.DAYS_TO_SAVE_CONTENT)
+async def delete_expired_messages() -> Tuple[int, int]:
+    """
+    Удаляет сообщения старше DAYS_TO_SAVE_CONTENT и их файлы. Возвращает количество строк и освобожденных байт.
+    """
+    from_date = get_retention_date()
+    logger.info(f"Start deleting messages from {from_date}")
+
+    rows, freed_bytes = 0, 0
+    partitions = await user_peer_message_repository.get_partitions()
+
+    # Секции создаются заранее, чтобы новые сообщения не попадали в секцию по умолчанию
+    today = datetime.now().date()
+    for day in (today + timedelta(days=i) for i in range(settings.PARTITIONS_DAYS_AHEAD + 1)):
+        if day not in partitions:
+            try:
+                await user_peer_message_repository.create_partition(day)
+            except Exception as e:
+                # Не мешаем удалению устаревших секций, создание повторится при следующем запуске
+                logger.error(f"Error to create partition for {day}", exc_info=e)
+
+    # Секции, полностью вышедшие за срок хранения, удаляются целиком
+    for day in sorted(day for day in partitions if day + timedelta(days=1) <= from_date.date()):
+        dropped, filepaths = await user_peer_message_repository.drop_partition(day)
+        rows += dropped
+        retention_deleted_messages.inc(dropped)
+        freed_bytes += await delete_unreferenced_files(set(filepaths))
+        logger.info(f"Dropped partition {user_peer_message_repository.get_partition_name(day)}")
+
+    # Оставшиеся устаревшие строки (секция по умолчанию и текущая граница срока) удаляются пачками
+    while filepaths := await user_peer_message_repository.delete_messages_earlier_date(
+            from_date=from_date, limit=settings.RETENTION_BATCH_SIZE
+    ):
+        rows += len(filepaths)
+        retention_deleted_messages.inc(len(filepaths))
+
+        freed_bytes += await delete_unreferenced_files({filepath for filepath in filepaths if filepath})
+
+    return rows, freed_bytes
+
+
+async def delete_unreferenced_files(filepaths: Set[str]) -> int:
+    """
+    Удаляет файлы, на которые не осталось ссылок из более свежих сообщений. Возвращает освобожденные байты.
+    """
+    if not filepaths:
+        return 0
+
+    # Сначала незаписанные строки: строка, ушедшая из очереди до запроса, уже видна в базе
+    referenced = user_peer_message_writer.get_pending_filepaths() & filepaths
+    referenced |= await user_peer_message_repository.get_referenced_filepaths(filepaths - referenced)
+    freed = await storage.deleteAll(filepaths - referenced)
+    retention_freed_bytes.inc(freed)
+    return freed
 
+
+async def cron_delete_messages():
     while True:
-        logger.info(f"Start deleting messages from {from_date}")
+        started = time.perf_counter()
         try:
-            while messages := await user_peer_message_repository.get_messages_earlier_date(from_date=from_date):
-                await user_peer_message_repository.delete(UserPeerMessage.id.in_([message.id for message in messages]))
-                await storage.deleteAll([message.filepath for message in messages if message.filepath])
+            rows, freed_bytes = await delete_expired_messages()
+            duration = time.perf_counter() - started
+            logger.info(
+                f"Deleted {rows} messages in {duration:.3f}s ({rows / duration:.1f} rows/s), "
+                f"freed {freed_bytes} bytes"
+            )
         except Exception as e:
-            logger.error("Error to cron delete messages", e)
+            logger.error("Error to cron delete messages", exc_info=e)
+        logger.info(f"Recent messages cache: {recent_messages.stats()}")
+        if isinstance(storage, TieredStorage):
+            logger.info(f"Hot storage: {storage.stats()}")
         await asyncio.sleep(settings.CRON_SECONDS_TO_DELETE_MESSAGES)
-
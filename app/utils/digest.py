@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Dict, List, Set, Tuple, Union
+
+from aiogram.types import Chat, User
+
+from app.config import settings
+from app.database.models import UserPeerMessage
+from app.utils.content import send_messages_deleted
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionDigest:
+    """
+    Собирает удаленные сообщения одного чата за короткое окно и отправляет их одним сводным уведомлением.
+    Сводки живут только в памяти: то, что накоплено за окно, теряется при падении процесса.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: Dict[Tuple[int, int], Tuple[Union[User, Chat], List[UserPeerMessage]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = asyncio.Event()
+
+    def add(self, peer: Union[User, Chat], user_peer_messages: List[UserPeerMessage]):
+        if not user_peer_messages:
+            return
+
+        key = (user_peer_messages[0].user_id, peer.id)
+        if key in self._pending:
+            self._pending[key][1].extend(user_peer_messages)
+        else:
+            self._pending[key] = (peer, list(user_peer_messages))
+            task = asyncio.create_task(self.flush(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, key: Tuple[int, int]):
+        # При остановке накопленные сводки отправляются сразу, не дожидаясь конца окна
+        try:
+            await asyncio.wait_for(self._closed.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        peer, user_peer_messages = self._pending.pop(key)
+        try:
+            await send_messages_deleted(peer, user_peer_messages)
+        except Exception as e:
+            logger.error(f"Error to send deletion digest of {len(user_peer_messages)} messages", exc_info=e)
+
+    async def join(self):
+        """
+        Дожидается отправки всех накопленных сводок.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def close(self):
+        """
+        Отправляет все накопленные сводки без ожидания окна.
+        """
+        self._closed.set()
+        await self.join()
+
+
+deletion_digest = DeletionDigest(window=settings.DELETION_DIGEST_MILLISECONDS / 1000)
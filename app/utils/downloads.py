@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Tuple
+
+import aiofiles
+from aiogram import Bot
+
+from app.database.models import UserPeerMessage, FileState
+from app.database.repositories import UserPeerMessageRepository
+from app.utils.metrics import download_bytes, stage_duration
+from app.utils.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class DownloadPool:
+    """
+    Пул воркеров, скачивающих медиа вне обработчиков апдейтов.
+    Сообщение сохраняется со статусом PENDING и переводится в READY/FAILED после загрузки.
+    Уже сохраненные файлы (тот же file_unique_id) повторно не скачиваются.
+    """
+
+    def __init__(
+            self, bot: Bot, repository: UserPeerMessageRepository, storage: Storage, workers: int, queue_size: int
+    ):
+        self.bot = bot
+        self.repository = repository
+        self.storage = storage
+        self.workers = workers
+        self.queue: asyncio.Queue[Tuple[UserPeerMessage, Optional[Awaitable], asyncio.Future]] = asyncio.Queue(maxsize=queue_size)
+
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.downloaded_bytes = 0
+        self.download_seconds = 0.0
+
+    async def submit(self, user_peer_message: UserPeerMessage, saved: Optional[Awaitable] = None) -> asyncio.Future:
+        """
+        Ставит загрузку в очередь. saved - ожидание вставки строки, если она пишется пакетно.
+        Возвращает future с итоговым FileState.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((user_peer_message, saved, future))
+        return future
+
+    async def fetch(self, file_id: str, key: str) -> FileState:
+        if await self.storage.exists(key):
+            self.deduplicated += 1
+            return FileState.READY
+
+        # Один и тот же файл могут одновременно прислать в нескольких сообщениях
+        if in_flight := self._in_flight.get(key):
+            self.deduplicated += 1
+            return await in_flight
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            file_state = await self.download(file_id, key)
+            future.set_result(file_state)
+            return file_state
+        finally:
+            del self._in_flight[key]
+
+    async def stream(self, file_path: str) -> AsyncIterator[bytes]:
+        """
+        Содержимое файла из Bot API частями, как в Bot.download_file, но без записи на диск.
+        """
+        api = self.bot.session.api
+        if api.is_local:
+            async with aiofiles.open(api.wrap_local_file.to_local(file_path), "rb") as handle:
+                while chunk := await handle.read(DOWNLOAD_CHUNK_SIZE):
+                    yield chunk
+        else:
+            async for chunk in self.bot.session.stream_content(
+                    url=api.file_url(self.bot.token, file_path), chunk_size=DOWNLOAD_CHUNK_SIZE
+            ):
+                yield chunk
+
+    async def download(self, file_id: str, key: str) -> FileState:
+        started = time.perf_counter()
+        try:
+            file = await self.bot.get_file(file_id)
+            size = await self.storage.put(key, self.stream(file.file_path))
+            file_state = FileState.READY
+        except Exception as e:
+            logger.error(f"Error to download file {file_id}", exc_info=e)
+            size = 0
+            file_state = FileState.FAILED
+        duration = time.perf_counter() - started
+        stage_duration.observe(duration, stage="download")
+
+        if file_state == FileState.READY:
+            download_bytes.inc(size)
+            self.downloaded += 1
+            self.downloaded_bytes += size
+            self.download_seconds += duration
+            logger.info(f"Downloaded {key}: {size} bytes in {duration:.3f}s")
+        else:
+            self.failed += 1
+
+        return file_state
+
+    async def process(self, user_peer_message: UserPeerMessage, saved: Optional[Awaitable]) -> FileState:
+        file_state = await self.fetch(user_peer_message.file_id, user_peer_message.filepath)
+        if saved:
+            await saved
+
+        user_peer_message.file_state = file_state
+        await self.repository.update(
+            UserPeerMessage.id == user_peer_message.id,
+            UserPeerMessage.created_at == user_peer_message.created_at,
+            values={"file_state": file_state}
+        )
+        return file_state
+
+    async def worker(self):
+        while True:
+            user_peer_message, saved, future = await self.queue.get()
+            try:
+                file_state = await self.process(user_peer_message, saved)
+                if not future.done():
+                    future.set_result(file_state)
+            except Exception as e:
+                logger.error(f"Error to finalize download of message {user_peer_message.id}", exc_info=e)
+                if not future.done():
+                    future.set_result(FileState.FAILED)
+            finally:
+                self.queue.task_done()
+
+    async def resume(self, since: datetime, batch_size: int = 1000):
+        """
+        Повторно ставит в очередь загрузки, прерванные перезапуском или завершившиеся ошибкой.
+        """
+        resumed, after = 0, None
+        try:
+            while user_peer_messages := await self.repository.get_unfinished_downloads(
+                    since=since, after=after, limit=batch_size
+            ):
+                # Новые сообщения с тем же файлом не скачают его повторно: загрузки дедуплицируются по ключу
+                for user_peer_message in user_peer_messages:
+                    await self.submit(user_peer_message)
+                resumed += len(user_peer_messages)
+                after = (user_peer_messages[-1].created_at, user_peer_messages[-1].id)
+        except Exception as e:
+            logger.error("Error to resume unfinished downloads", exc_info=e)
+        logger.info(f"Resumed {resumed} unfinished downloads")
+
+    async def run(self):
+        await asyncio.gather(*(self.worker() for _ in range(self.workers)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_size": self.queue.qsize(),
+            "downloaded": self.downloaded,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "downloaded_bytes": self.downloaded_bytes,
+            "download_seconds": self.download_seconds,
+        }
@@ -0,0 +1,259 @@
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def format_labels(labelnames: Sequence[str], labelvalues: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labelvalues
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labelnames, escaped)) + "}"
+
+
+class Metric:
+    """
+    Базовая метрика в текстовом формате Prometheus. Значения хранятся по кортежу значений меток.
+    """
+    type: str
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def get_labelvalues(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Счетчик. Значение либо увеличивается через inc, либо (для счетчика без меток) читается из функции при каждом сборе,
+    если объект уже сам считает события с момента запуска.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Счетчик без меток виден сразу, а не после первого inc
+        self.values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1, **labels: str):
+        labelvalues = self.get_labelvalues(labels)
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def set_function(self, function: Callable[[], float]):
+        if self.labelnames:
+            raise ValueError(f"Metric {self.name} with labels can not be read from a function")
+        self.function = function
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        if self.function:
+            return [(f"{self.name}_total", "", self.function())]
+        return [
+            (f"{self.name}_total", format_labels(self.labelnames, labelvalues), value)
+            for labelvalues, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """
+    Gauge без меток. Значение либо выставляется явно, либо читается из функции при каждом сборе.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [(self.name, "", self.function() if self.function else self.value)]
+
+
+class Timer:
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+            self, name: str, documentation: str, labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        labelvalues = self.get_labelvalues(labels)
+        if labelvalues not in self.counts:
+            self.counts[labelvalues] = [0] * len(self.buckets)
+            self.sums[labelvalues] = 0.0
+
+        counts = self.counts[labelvalues]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self.sums[labelvalues] += value
+
+    def time(self, **labels: str) -> Timer:
+        """
+        Замеряет длительность блока: with histogram.time(stage="download"): ...
+        """
+        return Timer(self, labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        for labelvalues, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.labelnames + ("le",), labelvalues + (format_value(bound),))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = format_labels(self.labelnames, labelvalues)
+            samples.append((f"{self.name}_sum", labels, self.sums[labelvalues]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+handler_duration = Histogram(
+    "handler_duration_seconds", "Duration of update handlers", labelnames=("handler",)
+)
+stage_duration = Histogram(
+    "stage_duration_seconds", "Duration of processing stages", labelnames=("stage",)
+)
+updates = Counter(
+    "updates", "Handled updates by handler and content type", labelnames=("handler", "content_type")
+)
+download_bytes = Counter("download_bytes", "Bytes of downloaded media")
+retention_deleted_messages = Counter("retention_deleted_messages", "Messages deleted by retention")
+retention_freed_bytes = Counter("retention_freed_bytes", "Bytes of media freed by retention")
+db_pool_size = Gauge("db_pool_size", "Connections kept in the database pool")
+db_pool_checked_out = Gauge("db_pool_checked_out", "Database connections in use")
+db_pool_overflow = Gauge("db_pool_overflow", "Database connections opened over the pool size")
+outbound_waiting = Gauge("outbound_waiting", "Outbound requests waiting for a rate limit slot")
+outbound_wait_seconds = Counter("outbound_wait_seconds", "Time outbound requests spent waiting for a rate limit slot")
+outbound_sent = Counter("outbound_sent", "Rate-limited outbound requests sent")
+outbound_retried = Counter("outbound_retried", "Outbound requests retried after flood control")
+outbound_chats = Gauge("outbound_chats", "Chats with a tracked outbound rate limit")
+business_connection_cache_size = Gauge("business_connection_cache_size", "Business connections kept in the cache")
+business_connection_cache_hits = Counter("business_connection_cache_hits", "Business connection cache hits")
+business_connection_cache_misses = Counter("business_connection_cache_misses", "Business connection cache misses")
+business_connection_cache_hit_ratio = Gauge(
+    "business_connection_cache_hit_ratio", "Share of business connection lookups served from the cache"
+)
+recent_messages_cache_size = Gauge("recent_messages_cache_size", "Messages kept in the recent messages cache")
+recent_messages_cache_bytes = Gauge("recent_messages_cache_bytes", "Estimated bytes of the recent messages cache")
+recent_messages_cache_hits = Counter("recent_messages_cache_hits", "Recent messages cache hits")
+recent_messages_cache_misses = Counter("recent_messages_cache_misses", "Recent messages cache misses")
+recent_messages_cache_hit_ratio = Gauge(
+    "recent_messages_cache_hit_ratio", "Share of last message lookups served from the recent messages cache"
+)
+storage_hot_bytes = Gauge("storage_hot_bytes", "Bytes kept in the hot local storage tier")
+storage_hot_files = Gauge("storage_hot_files", "Files kept in the hot local storage tier")
+storage_hot_evictions = Counter("storage_hot_evictions", "Files evicted from the hot local storage tier")
+ordering_keys = Gauge("ordering_keys", "Chats with updates waiting or being processed")
+ordering_running_keys = Gauge("ordering_running_keys", "Chats with an update being processed")
+ordering_queued_updates = Gauge("ordering_queued_updates", "Updates waiting for earlier updates of the same chat")
+ordering_max_queue_depth = Gauge("ordering_max_queue_depth", "Updates queued for the busiest chat")
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Считает апдейты по типу контента и время работы каждого обработчика.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        content_type = getattr(event, "content_type", None)
+        updates.inc(handler=name, content_type=content_type.value if content_type else type(event).__name__)
+        with handler_duration.time(handler=name):
+            return await handler(event, data)
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def run_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Поднимает локальный HTTP-эндпоинт /metrics. Возвращает runner для остановки.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Metrics are served on http://{host}:{port}/metrics")
+    return runner
@@ -6,3 +6,6 @@ AFTER_EDIT_MESSAGE_TEXT = "📝 Сообщение изменено:\n\nПосл
 
 DELETE_MESSAGE_TEXT = "🗑️ Сообщение удалено:\n\n<blockquote>{text}</blockquote>\n\n🤖 @YourSmartSecretaryBot"
 DELETE_VIDEO_NOTE_MESSAGE_TEXT = "🗑️ Сообщение удалено\n\n🤖 @YourSmartSecretaryBot"
+DELETE_MESSAGES_DIGEST_TEXT = "🗑️ Сообщения удалены:\n\n{texts}\n\n🤖 @YourSmartSecretaryBot"
+DELETE_MESSAGES_DIGEST_ITEM_TEXT = "<blockquote>{text}</blockquote>"
+DELETE_MESSAGES_ALBUM_TEXT = "🗑️ Сообщения выше удалены\n\n🤖 @YourSmartSecretaryBot"
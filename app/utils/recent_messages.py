@@ -0,0 +1,65 @@
+import sys
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.types import ContentType
+
+from app.database.models import UserPeerMessage
+from app.utils.cache import TTLCache
+
+# Примерный размер записи без текста: объект, ключ и строки с путями
+RECORD_OVERHEAD_BYTES = 512
+
+
+@dataclass(frozen=True, slots=True)
+class RecentMessage:
+    """
+    Компактная копия UserPeerMessage: только поля, нужные для уведомлений, без ORM-состояния и JSON сообщения.
+    """
+    user_id: int
+    chat_id: int
+    message_id: int
+    type: ContentType
+    text: Optional[str]
+    file_id: Optional[str]
+    filepath: Optional[str]
+    filename: Optional[str]
+    mimetype: Optional[str]
+
+    @classmethod
+    def from_model(cls, user_peer_message: UserPeerMessage) -> "RecentMessage":
+        return cls(**{field.name: getattr(user_peer_message, field.name) for field in fields(cls)})
+
+    def to_model(self) -> UserPeerMessage:
+        return UserPeerMessage(**{field.name: getattr(self, field.name) for field in fields(self)})
+
+    def weight(self) -> int:
+        return RECORD_OVERHEAD_BYTES + (sys.getsizeof(self.text) if self.text else 0)
+
+
+class RecentMessages:
+    """
+    Кэш последних версий недавно сохраненных сообщений по (user_id, chat_id, message_id).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: int):
+        self.cache: TTLCache[RecentMessage] = TTLCache(
+            maxsize=maxsize, ttl=ttl, max_weight=max_bytes, weigher=RecentMessage.weight
+        )
+
+    @staticmethod
+    def get_key(user_id: int, chat_id: int, message_id: int) -> Tuple[int, int, int]:
+        return user_id, chat_id, message_id
+
+    def remember(self, user_peer_message: UserPeerMessage):
+        self.cache.set(
+            self.get_key(user_peer_message.user_id, user_peer_message.chat_id, user_peer_message.message_id),
+            RecentMessage.from_model(user_peer_message)
+        )
+
+    def get(self, user_id: int, chat_id: int, message_id: int) -> Optional[UserPeerMessage]:
+        if recent_message := self.cache.get(self.get_key(user_id, chat_id, message_id)):
+            return recent_message.to_model()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
@@ -0,0 +1,239 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import aiohttp
+from yarl import URL
+
+from app.utils.storage import Storage
+from app.utils.tasks import gather_with_concurrency
+
+logger = logging.getLogger(__name__)
+
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b"").hexdigest()
+# Ограничение S3 на количество ключей в одном DeleteObjects
+DELETE_OBJECTS_MAX_KEYS = 1000
+# Минимальный размер части multipart upload в S3 (кроме последней)
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def get_tag(element: ElementTree.Element) -> str:
+    # Ответы S3 приходят с пространством имен: {http://s3.amazonaws.com/doc/2006-03-01/}UploadId
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def find_text(root: ElementTree.Element, tag: str) -> Optional[str]:
+    for element in root.iter():
+        if get_tag(element) == tag:
+            return element.text
+
+
+class S3Storage(Storage):
+    """
+    S3-совместимое хранилище (AWS S3, MinIO) поверх aiohttp с подписью запросов AWS Signature V4.
+    Объекты адресуются path-style: {endpoint}/{bucket}/{key}.
+    """
+
+    def __init__(
+            self, endpoint_url: str, bucket: str, access_key: str, secret_key: str, region: str = "us-east-1",
+            prefix: str = "", max_connections: int = 64, part_size: int = 8 * 1024 * 1024,
+            delete_concurrency: int = 32, chunk_size: int = 256 * 1024
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.max_connections = max_connections
+        self.part_size = max(part_size, MULTIPART_MIN_PART_SIZE)
+        self.delete_concurrency = delete_concurrency
+        self.chunk_size = chunk_size
+        self.host = URL(self.endpoint_url).raw_authority
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Сессия создается лениво: ей нужен запущенный цикл событий
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def get_key(self, name: str) -> str:
+        return self.prefix + name
+
+    def get_signing_key(self, date: str) -> bytes:
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def sign(
+            self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], payload_hash: str
+    ) -> Dict[str, str]:
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = amz_date[:8]
+
+        headers = {
+            **{name.lower(): value.strip() for name, value in headers.items()},
+            "host": self.host,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+        }
+        signed_headers = ";".join(sorted(headers))
+        canonical_request = "\n".join([
+            method,
+            path,
+            "&".join(f"{quote(name, safe='~')}={quote(value, safe='~')}" for name, value in sorted(query.items())),
+            "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)),
+            signed_headers,
+            payload_hash,
+        ])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        signature = hmac.new(self.get_signing_key(date), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    def request(
+            self, method: str, key: str = "", query: Optional[Dict[str, str]] = None, body: bytes = b"",
+            headers: Optional[Dict[str, str]] = None
+    ):
+        query = query or {}
+        path = quote(f"/{self.bucket}/{key}" if key else f"/{self.bucket}", safe="/~")
+        headers = self.sign(
+            method, path, query, headers or {}, hashlib.sha256(body).hexdigest() if body else EMPTY_PAYLOAD_HASH
+        )
+        query_string = "&".join(
+            f"{quote(name, safe='~')}={quote(value, safe='~')}" if value else quote(name, safe="~")
+            for name, value in sorted(query.items())
+        )
+        # Путь и запрос уже закодированы для подписи, aiohttp не должен кодировать их повторно
+        url = URL(self.endpoint_url + path + (f"?{query_string}" if query_string else ""), encoded=True)
+        return self.session.request(method, url, data=body or None, headers=headers)
+
+    async def exists(self, key: str) -> bool:
+        async with self.request("HEAD", key) as response:
+            if response.status == 404:
+                return False
+            response.raise_for_status()
+            return True
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        buffer = bytearray()
+        upload_id = None
+        parts: List[Tuple[int, str]] = []
+        size = 0
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = await self.create_multipart_upload(key)
+                    parts.append(await self.upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+                    buffer.clear()
+
+            # Маленькие файлы загружаются одним запросом
+            if upload_id is None:
+                async with self.request("PUT", key, body=bytes(buffer)) as response:
+                    response.raise_for_status()
+                return size
+
+            if buffer:
+                parts.append(await self.upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+            await self.complete_multipart_upload(key, upload_id, parts)
+            return size
+        except BaseException:
+            if upload_id is not None:
+                await asyncio.shield(self.abort_multipart_upload(key, upload_id))
+            raise
+
+    async def create_multipart_upload(self, key: str) -> str:
+        async with self.request("POST", key, query={"uploads": ""}) as response:
+            response.raise_for_status()
+            return find_text(ElementTree.fromstring(await response.read()), "UploadId")
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> Tuple[int, str]:
+        query = {"partNumber": str(part_number), "uploadId": upload_id}
+        async with self.request("PUT", key, query=query, body=body) as response:
+            response.raise_for_status()
+            return part_number, response.headers["ETag"]
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        body = "<CompleteMultipartUpload>{}</CompleteMultipartUpload>".format(
+            "".join(f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>" for number, etag in parts)
+        ).encode()
+        async with self.request("POST", key, query={"uploadId": upload_id}, body=body) as response:
+            response.raise_for_status()
+            # S3 может вернуть ошибку в теле ответа с кодом 200
+            if find_text(ElementTree.fromstring(await response.read()), "Code"):
+                raise RuntimeError(f"Error to complete multipart upload of {key}")
+
+    async def abort_multipart_upload(self, key: str, upload_id: str):
+        try:
+            async with self.request("DELETE", key, query={"uploadId": upload_id}) as response:
+                response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Error to abort multipart upload of {key}", exc_info=e)
+
+    async def stream(self, key: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        async with self.request("GET", key) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(chunk_size or self.chunk_size):
+                yield chunk
+
+    async def delete(self, key: str) -> int:
+        return await self.deleteAll([key])
+
+    async def delete_objects(self, keys: List[str]) -> int:
+        body = "<Delete><Quiet>true</Quiet>{}</Delete>".format(
+            "".join(f"<Object><Key>{escape(key)}</Key></Object>" for key in keys)
+        ).encode()
+        headers = {"Content-MD5": base64.b64encode(hashlib.md5(body).digest()).decode()}
+        async with self.request("POST", query={"delete": ""}, body=body, headers=headers) as response:
+            response.raise_for_status()
+            errors = [
+                element for element in ElementTree.fromstring(await response.read()).iter()
+                if get_tag(element) == "Error"
+            ]
+        for error in errors:
+            logger.error(f"Error to delete object {find_text(error, 'Key')}: {find_text(error, 'Message')}")
+        return len(keys) - len(errors)
+
+    async def deleteAll(self, keys: Iterable[str]) -> int:
+        """
+        Удаляет объекты пачками DeleteObjects, пачки отправляются параллельно.
+        S3 не сообщает размер удаленных объектов, поэтому освобожденные байты не считаются и возвращается 0.
+        """
+        keys = list(keys)
+        results = await gather_with_concurrency(
+            self.delete_concurrency,
+            *(
+                self.delete_objects(keys[i:i + DELETE_OBJECTS_MAX_KEYS])
+                for i in range(0, len(keys), DELETE_OBJECTS_MAX_KEYS)
+            )
+        )
+        deleted = sum(result for result in results if isinstance(result, int))
+        logger.debug(f"Deleted {deleted} of {len(keys)} objects from bucket {self.bucket}")
+        return 0
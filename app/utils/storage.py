@@ -1,57 +1,230 @@
 import abc
+import asyncio
+import functools
+import hashlib
 import logging
+import math
 import os
-from typing import Iterable
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, AsyncIterable, AsyncIterator, Callable, Iterable, List, Optional, Set, Tuple, \
+    TypeVar
 
 import aiofiles
-import aiofiles.os
-from aiogram.types import BufferedInputFile
+from aiogram import Bot
+from aiogram.types import InputFile
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Меньшие части не окупают переход в поток
+DELETE_CHUNK_MIN_SIZE = 64
+# Попытки создать файл, если его каталог одновременно удаляется как пустой
+CREATE_ATTEMPTS = 5
+# Размер части при чтении файла на отправку: память на одну отправку не зависит от размера файла
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
 
 class Storage(abc.ABC):
 
+    def get_key(self, name: str) -> str:
+        """
+        Ключ хранилища для относительного имени файла.
+        """
+        return name
+
+    def content_key(self, content_id: str, filename: Optional[str] = None) -> str:
+        """
+        Ключ, адресуемый содержимым: одинаковый content_id (file_unique_id) дает один и тот же ключ.
+        """
+        extension = os.path.splitext(filename or "")[1]
+        # Префиксы file_unique_id почти одинаковы, поэтому каталог выбирается по хэшу, а не по началу id
+        shard = hashlib.md5(content_id.encode()).hexdigest()
+        return self.get_key(f"{shard[:2]}/{shard[2:4]}/{content_id}{extension}")
+
     @abc.abstractmethod
-    async def save(self, key: str, file: bytes) -> str:
+    async def exists(self, key: str) -> bool:
         pass
 
     @abc.abstractmethod
-    async def get(self, key: str) -> BufferedInputFile:
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """
+        Записывает файл из потока частей и возвращает его размер.
+        Файл становится доступен по ключу только после успешной записи целиком.
+        """
         pass
 
+    async def save(self, key: str, file: bytes) -> str:
+        async def chunks():
+            yield file
+
+        await self.put(key, chunks())
+        return key
+
     @abc.abstractmethod
-    async def delete(self, key: str):
+    def stream(self, key: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Читает файл частями по chunk_size байт, не загружая его в память целиком.
+        """
         pass
 
+    def get(self, key: str, filename: Optional[str] = None) -> InputFile:
+        """
+        Файл для отправки в Telegram: содержимое читается из хранилища частями во время загрузки.
+        """
+        return StorageInputFile(self, key, filename or os.path.basename(key))
+
     @abc.abstractmethod
-    async def deleteAll(self, keys: Iterable[str]):
+    async def delete(self, key: str) -> int:
+        """
+        Удаляет файл и возвращает количество освобожденных байт.
+        """
         pass
 
+    @abc.abstractmethod
+    async def deleteAll(self, keys: Iterable[str]) -> int:
+        pass
+
+    async def close(self):
+        """
+        Освобождает ресурсы хранилища: соединения, потоки.
+        """
+        pass
+
+
+class StorageInputFile(InputFile):
+    """
+    InputFile, читающий содержимое из Storage потоком. Повторная отправка (например, после 429) читает файл заново.
+    """
+
+    def __init__(self, storage: Storage, key: str, filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.storage = storage
+        self.key = key
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        async for chunk in self.storage.stream(self.key, self.chunk_size):
+            yield chunk
+
 
 class FileSystemStorage(Storage):
-    async def save(self, key: str, file: bytes) -> str:
-        try:
-            async with aiofiles.open(key, "wb") as handle:
-                await handle.write(file)
-            return key
-        except Exception as e:
-            logger.error(f"Error to save file {key}", e)
+    """
+    Файлы лежат плоско в двухуровневых каталогах по хэшу ключа: root/ab/cd/<content_id><ext>.
+    Операции с каталогами и пакетное удаление выполняются в отдельном пуле потоков, а не в цикле событий.
+    """
 
-    async def get(self, key: str) -> BufferedInputFile:
-        try:
-            async with aiofiles.open(key, "rb") as handle:
-                filename = os.path.basename(key)
-            return BufferedInputFile(await handle.read(), filename)
-        except Exception as e:
-            logger.error(f"Error to get file {key}", e)
+    def __init__(self, root: str, delete_concurrency: int = 32, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.root = os.path.normpath(root)
+        self.delete_concurrency = delete_concurrency
+        self.chunk_size = chunk_size
+        self.executor = ThreadPoolExecutor(max_workers=delete_concurrency, thread_name_prefix="storage")
+
+    def get_key(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def exists(self, key: str) -> bool:
+        return await self.run(os.path.exists, key)
+
+    async def prepare(self, key: str):
+        await self.run(functools.partial(os.makedirs, os.path.dirname(key), exist_ok=True))
+
+    async def create(self, path: str):
+        """
+        Создает файл вместе с недостающими каталогами. Пустой каталог может удалить prune_directories
+        после makedirs, но до создания файла; тогда создание повторяется.
+        """
+        for attempt in range(1, CREATE_ATTEMPTS + 1):
+            await self.prepare(path)
+            try:
+                return await aiofiles.open(path, "xb", executor=self.executor)
+            except FileNotFoundError:
+                if attempt == CREATE_ATTEMPTS:
+                    raise
 
-    async def delete(self, key: str):
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        # Пишем во временный файл, чтобы недописанный файл не считался сохраненным.
+        # Имя уникально: один и тот же файл могут одновременно скачивать несколько процессов
+        part = f"{key}.{uuid.uuid4().hex}.part"
+        size = 0
+        handle = await self.create(part)
         try:
-            await aiofiles.os.remove(key)
-        except Exception as e:
-            logger.error(f"Error to delete file {key}", e)
+            try:
+                async for chunk in chunks:
+                    await handle.write(chunk)
+                    size += len(chunk)
+            finally:
+                await handle.close()
+            await self.run(os.replace, part, key)
+        except BaseException:
+            await self.run(self.remove_files, [part])
+            raise
+        return size
 
-    async def deleteAll(self, keys: Iterable[str]):
+    async def stream(self, key: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        async with aiofiles.open(key, "rb", executor=self.executor) as handle:
+            while chunk := await handle.read(chunk_size or self.chunk_size):
+                yield chunk
+
+    def get(self, key: str, filename: Optional[str] = None) -> InputFile:
+        return StorageInputFile(self, key, filename or os.path.basename(key), chunk_size=self.chunk_size)
+
+    def remove_files(self, keys: List[str]) -> Tuple[int, Set[str]]:
+        """
+        Удаляет файлы в потоке пула. Возвращает освобожденные байты и каталоги, которые могли опустеть.
+        """
+        freed_bytes, directories = 0, set()
         for key in keys:
-            await self.delete(key)
+            try:
+                size = os.stat(key).st_size
+                os.remove(key)
+                freed_bytes += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error to delete file {key}", exc_info=e)
+            directories.add(os.path.dirname(key))
+        return freed_bytes, directories
+
+    def prune_directories(self, directories: Iterable[str]) -> int:
+        """
+        Удаляет опустевшие каталоги вверх до корня хранилища. Возвращает количество удаленных каталогов.
+        """
+        pruned = 0
+        # Сначала самые глубокие, чтобы родитель успел опустеть
+        for directory in sorted(set(map(os.path.normpath, directories)), key=len, reverse=True):
+            while directory != self.root and os.path.commonpath([self.root, directory]) == self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    # Каталог не пуст или уже удален другим пакетом
+                    break
+                pruned += 1
+                directory = os.path.dirname(directory)
+        return pruned
+
+    async def delete(self, key: str) -> int:
+        return await self.deleteAll([key])
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+
+    async def deleteAll(self, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        if not keys:
+            return 0
+
+        # Пачка делится на части по числу потоков: один переход в пул на часть, а не на каждый файл
+        chunk_size = max(DELETE_CHUNK_MIN_SIZE, math.ceil(len(keys) / self.delete_concurrency))
+        results = await asyncio.gather(
+            *(self.run(self.remove_files, keys[i:i + chunk_size]) for i in range(0, len(keys), chunk_size))
+        )
+
+        freed_bytes = sum(freed for freed, _ in results)
+        directories = set().union(*(directories for _, directories in results))
+        pruned = await self.run(self.prune_directories, directories)
+        logger.debug(f"Deleted {len(keys)} files ({freed_bytes} bytes), pruned {pruned} directories")
+        return freed_bytes
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+async def gather_with_concurrency(limit: int, *coroutines: Awaitable[Any]) -> List[Any]:
+    """
+    Выполняет корутины конкурентно, но не более limit одновременно.
+    Ошибка одной корутины не прерывает остальные и возвращается в списке результатов.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await coroutine
+
+    results = await asyncio.gather(*(run(coroutine) for coroutine in coroutines), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Error in concurrent task", exc_info=result)
+    return results
+
+
+class KeyedSerialExecutor:
+    """
+    Выполняет задачи с одинаковым ключом строго по очереди, а с разными ключами конкурентно.
+    max_running ограничивает число ключей, задачи которых выполняются одновременно.
+    """
+
+    def __init__(self, max_running: Optional[int] = None):
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+        self._depths: Dict[Hashable, int] = {}
+        self._slots = asyncio.Semaphore(max_running) if max_running else None
+        self.running = 0
+
+    def submit(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        previous = self._tails.get(key)
+        self._depths[key] = self._depths.get(key, 0) + 1
+
+        async def run():
+            try:
+                if previous:
+                    await asyncio.wait([previous])
+                if self._slots:
+                    await self._slots.acquire()
+                self.running += 1
+                try:
+                    return await factory()
+                finally:
+                    self.running -= 1
+                    if self._slots:
+                        self._slots.release()
+            except Exception as e:
+                logger.error(f"Error in task for key {key}", exc_info=e)
+            finally:
+                self._depths[key] -= 1
+                if not self._depths[key]:
+                    del self._depths[key]
+                if self._tails.get(key) is task:
+                    del self._tails[key]
+
+        task = self._tails[key] = asyncio.create_task(run())
+        return task
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._depths),
+            "running": self.running,
+            "queued": sum(self._depths.values()) - self.running,
+            "max_depth": max(self._depths.values(), default=0),
+        }
+
+    async def join(self):
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.utils.cache import TTLCache
+from app.utils.metrics import stage_duration
+
+logger = logging.getLogger(__name__)
+
+# Методы, на которые распространяются лимиты Telegram на отправку сообщений
+LIMITED_METHOD_PREFIXES = ("send", "copy", "forward")
+
+
+class TokenBucket:
+    """
+    Token bucket с очередью ожидающих по порядку (FIFO) и паузой по retry_after.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Ограничивает скорость исходящих отправок глобально и для каждого чата и повторяет запрос после 429.
+    """
+
+    def __init__(
+            self, global_rate: float, chat_rate: float, chat_burst: float, max_retries: int, max_chats: int = 10_000
+    ):
+        self.global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        # Неактивные чаты вытесняются, когда их bucket гарантированно полон
+        self.chat_buckets: TTLCache[TokenBucket] = TTLCache(maxsize=max_chats, ttl=chat_burst / chat_rate + 60)
+
+        self.waiting = 0
+        self.sent = 0
+        self.retried = 0
+        self.wait_seconds = 0.0
+
+    def get_chat_bucket(self, chat_id: Any) -> TokenBucket:
+        if not (bucket := self.chat_buckets.get(chat_id)):
+            bucket = TokenBucket(rate=self.chat_rate, capacity=self.chat_burst)
+        # Продлеваем время жизни при каждом обращении
+        self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    async def __call__(
+            self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot, method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        if not method.__api_method__.startswith(LIMITED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id: Optional[Any] = getattr(method, "chat_id", None)
+        chat_bucket = self.get_chat_bucket(chat_id) if chat_id is not None else None
+
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            self.waiting += 1
+            try:
+                if chat_bucket:
+                    await chat_bucket.acquire()
+                await self.global_bucket.acquire()
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.monotonic() - started
+                stage_duration.observe(time.monotonic() - started, stage="send_wait")
+
+            try:
+                with stage_duration.time(stage="send"):
+                    response = await make_request(bot, method)
+                self.sent += 1
+                return response
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                logger.warning(f"Flood control on {method.__api_method__} to {chat_id}, retry after {e.retry_after}s")
+                (chat_bucket or self.global_bucket).pause(e.retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": self.waiting,
+            "sent": self.sent,
+            "retried": self.retried,
+            "wait_seconds": self.wait_seconds,
+            "chats": len(self.chat_buckets),
+        }
@@ -0,0 +1,282 @@
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.utils.storage import FileSystemStorage, Storage
+from app.utils.tasks import gather_with_concurrency
+
+logger = logging.getLogger(__name__)
+
+# Файл блокировки в корне горячего уровня: вытеснение выполняет один процесс за раз
+EVICTION_LOCK_NAME = ".eviction.lock"
+
+
+class TieredStorage(Storage):
+    """
+    Горячий уровень на локальном диске с квотой в байтах поверх холодного хранилища (S3 или другой диск).
+    Новые файлы пишутся на диск. При превышении квоты давно не использованные файлы (LRU по времени изменения,
+    которое обновляется при чтении) переносятся в холодный уровень и удаляются с диска.
+    Файл, прочитанный из холодного уровня, возвращается на диск.
+
+    Состояние диска не хранится в памяти процесса: воркеры с общим CACHE_DIR видят файлы друг друга,
+    а занятость диска измеряется сканированием. Файлы переносит процесс, захвативший файловую блокировку,
+    а запись сверх квоты ждет окончания переноса.
+    """
+
+    def __init__(
+            self, hot: FileSystemStorage, cold: Storage, max_bytes: int, scan_interval: float = 10.0,
+            demote_concurrency: int = 8
+    ):
+        self.hot = hot
+        self.cold = cold
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        self.demote_concurrency = demote_concurrency
+
+        # Занятость диска по последнему сканированию плюс записанное этим процессом после него
+        self.hot_bytes = 0
+        self.hot_files = 0
+        self.scanned_at = 0.0
+        self._evicting: Optional[asyncio.Task] = None
+        self._rescan = False
+        self._promoting: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.demotions = 0
+        self.promotions = 0
+
+    def normalize(self, key: str) -> str:
+        # Старые записи хранят абсолютный путь внутри горячего уровня
+        if os.path.isabs(key) and os.path.commonpath([self.hot.root, key]) == self.hot.root:
+            return os.path.relpath(key, self.hot.root)
+        return key
+
+    def scan(self) -> List[Tuple[float, str, int]]:
+        files = []
+        for directory, _, filenames in os.walk(self.hot.root):
+            for filename in filenames:
+                if filename.endswith(".part") or filename == EVICTION_LOCK_NAME:
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, os.path.relpath(path, self.hot.root), stat.st_size))
+        return sorted(files)
+
+    def lock(self) -> int:
+        """
+        Ждет блокировку вытеснения (вызывается в потоке пула). Возвращает дескриптор файла блокировки.
+        """
+        os.makedirs(self.hot.root, exist_ok=True)
+        descriptor = os.open(os.path.join(self.hot.root, EVICTION_LOCK_NAME), os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(descriptor)
+            raise
+        return descriptor
+
+    @staticmethod
+    def unlock(descriptor: int):
+        fcntl.flock(descriptor, fcntl.LOCK_UN)
+        os.close(descriptor)
+
+    def schedule_eviction(self) -> Optional[asyncio.Task]:
+        """
+        Запускает проверку квоты в фоне, если диск сверх квоты или давно не сканировался
+        (раз в scan_interval, чтобы учесть файлы других процессов). Возвращает задачу вытеснения, если она идет.
+        """
+        if self._evicting and not self._evicting.done():
+            # Текущий проход мог отсканировать диск до этой записи
+            if self.hot_bytes > self.max_bytes:
+                self._rescan = True
+            return self._evicting
+        if time.monotonic() - self.scanned_at < self.scan_interval and self.hot_bytes <= self.max_bytes:
+            return None
+        self._evicting = asyncio.create_task(self.evict())
+        return self._evicting
+
+    async def reserve(self):
+        """
+        Обратное давление: пока диск сверх квоты, запись не начинается и не завершается, а ждет вытеснения.
+        """
+        if self.hot_bytes > self.max_bytes and (task := self.schedule_eviction()):
+            # Отмена одного писателя не должна прерывать вытеснение, которого ждут остальные
+            await asyncio.shield(task)
+
+    def update(self, files: List[Tuple[float, str, int]]):
+        self.scanned_at = time.monotonic()
+        self.hot_bytes, self.hot_files = sum(size for _, _, size in files), len(files)
+
+    async def evict(self):
+        """
+        Переносит давно не использованные файлы в холодный уровень, пока диск не уложится в квоту.
+        """
+        try:
+            # Пока идет перенос, файлы продолжают записываться, поэтому после прохода диск сканируется заново
+            while True:
+                self._rescan = False
+                self.update(await self.hot.run(self.scan))
+                if self.hot_bytes <= self.max_bytes:
+                    if self._rescan:
+                        continue
+                    return
+
+                descriptor = await self.hot.run(self.lock)
+                try:
+                    # Пока ждали блокировку, место мог освободить другой процесс
+                    files = await self.hot.run(self.scan)
+                    self.update(files)
+                    victims, excess = [], self.hot_bytes - self.max_bytes
+                    for _, key, size in files:
+                        if excess <= 0:
+                            break
+                        victims.append((key, size))
+                        excess -= size
+                    results = await gather_with_concurrency(
+                        self.demote_concurrency, *(self.demote(key, size) for key, size in victims)
+                    )
+                finally:
+                    await self.hot.run(self.unlock, descriptor)
+
+                if victims and all(isinstance(result, Exception) for result in results):
+                    # Холодный уровень недоступен: писатели продолжают сверх квоты, повтор - при следующей записи
+                    return
+        except Exception as e:
+            logger.error("Error to evict files from hot storage", exc_info=e)
+
+    async def demote(self, key: str, size: int):
+        path, cold_key = self.hot.get_key(key), self.cold.get_key(key)
+        try:
+            await self.cold.put(cold_key, self.hot.stream(path))
+            self.demotions += 1
+        except FileNotFoundError:
+            # Файл уже удален, например сроком хранения
+            self.hot_bytes -= size
+            self.hot_files -= 1
+            return
+
+        if await self.hot.delete(path):
+            self.evictions += 1
+            self.evicted_bytes += size
+        else:
+            # Файл удалили во время переноса: копия в холодном уровне больше не нужна
+            await self.cold.delete(cold_key)
+        self.hot_bytes -= size
+        self.hot_files -= 1
+
+    async def exists(self, key: str) -> bool:
+        self.schedule_eviction()
+        key = self.normalize(key)
+        return await self.hot.exists(self.hot.get_key(key)) or await self.cold.exists(self.cold.get_key(key))
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        key = self.normalize(key)
+        await self.reserve()
+        size = await self.hot.put(self.hot.get_key(key), chunks)
+        self.hot_bytes += size
+        self.hot_files += 1
+        await self.reserve()
+        return size
+
+    async def stream(self, key: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        key = self.normalize(key)
+        path = self.hot.get_key(key)
+        chunks = self.hot.stream(path, chunk_size)
+        try:
+            # Время изменения - общая для всех процессов отметка последнего использования
+            await self.hot.run(os.utime, path)
+            # Файл открывается на первой части: открытый файл вытеснение уже не прервет
+            first = await chunks.__anext__()
+        except FileNotFoundError:
+            await chunks.aclose()
+        except StopAsyncIteration:
+            self.hits += 1
+            return
+        else:
+            self.hits += 1
+            try:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+            return
+
+        self.misses += 1
+        async for chunk in self.cold.stream(self.cold.get_key(key), chunk_size):
+            yield chunk
+
+        if key not in self._promoting:
+            self._promoting[key] = asyncio.create_task(self.promote(key))
+
+    async def promote(self, key: str):
+        """
+        Возвращает файл из холодного уровня на диск: его снова отправляют, значит он горячий.
+        """
+        try:
+            await self.reserve()
+            size = await self.hot.put(self.hot.get_key(key), self.cold.stream(self.cold.get_key(key)))
+            self.hot_bytes += size
+            self.hot_files += 1
+            self.promotions += 1
+            await self.reserve()
+        except Exception as e:
+            logger.error(f"Error to promote {key} from cold storage", exc_info=e)
+        finally:
+            del self._promoting[key]
+
+    async def delete(self, key: str) -> int:
+        return await self.deleteAll([key])
+
+    async def deleteAll(self, keys: Iterable[str]) -> int:
+        keys = [self.normalize(key) for key in keys]
+        if not keys:
+            return 0
+
+        # Любой процесс мог записать файл на диск или перенести его в холодный уровень, поэтому удаляем из обоих
+        freed_bytes = await self.hot.deleteAll(self.hot.get_key(key) for key in keys)
+        self.hot_bytes = max(self.hot_bytes - freed_bytes, 0)
+        freed_bytes += await self.cold.deleteAll(self.cold.get_key(key) for key in keys)
+        return freed_bytes
+
+    async def join(self):
+        """
+        Дожидается фоновых вытеснения и возврата файлов на диск.
+        """
+        tasks: Set[asyncio.Task] = set(self._promoting.values())
+        if self._evicting:
+            tasks.add(self._evicting)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def close(self):
+        for task in [self._evicting, *self._promoting.values()]:
+            if task:
+                task.cancel()
+        await self.hot.close()
+        await self.cold.close()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "files": self.hot_files,
+            "bytes": self.hot_bytes,
+            "max_bytes": self.max_bytes,
+            "occupancy": self.hot_bytes / self.max_bytes if self.max_bytes else 0.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "demotions": self.demotions,
+            "promotions": self.promotions,
+        }
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
+
+from app.config import settings
+from app.loader import bot, dp
+
+logger = logging.getLogger(__name__)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def set_webhook():
+    await bot.set_webhook(
+        url=settings.WEBHOOK_URL + settings.WEBHOOK_PATH,
+        secret_token=settings.WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+
+
+class WebhookHandler:
+    """
+    Принимает апдейты вебхука: Telegram получает ответ сразу, апдейт обрабатывается в фоновой задаче.
+    Задачи отслеживаются, чтобы при остановке дождаться уже принятых апдейтов.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.tasks: Set[asyncio.Task] = set()
+
+    def verify_secret(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        return secrets.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.secret_token)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request):
+            return web.Response(body="Unauthorized", status=401)
+
+        task = asyncio.create_task(self.feed_update(await request.json(loads=self.bot.session.json_loads)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.json_response({})
+
+    async def feed_update(self, update: Dict[str, Any]):
+        result = await self.dispatcher.feed_raw_update(self.bot, update)
+        # Ответ обработчика нельзя вернуть в ответе на запрос, он уже отправлен
+        if isinstance(result, TelegramMethod):
+            await self.dispatcher.silent_call_request(self.bot, result)
+
+    async def join(self, timeout: float):
+        if tasks := set(self.tasks):
+            logger.info(f"Waiting for {len(tasks)} updates to finish")
+            await asyncio.wait(tasks, timeout=timeout)
+
+
+def create_webhook_app() -> web.Application:
+    app = web.Application()
+
+    handler = WebhookHandler(dispatcher=dp, bot=bot, secret_token=settings.WEBHOOK_SECRET)
+    app.router.add_post(settings.WEBHOOK_PATH, handler.handle)
+    app.router.add_get(settings.HEALTH_PATH, health)
+
+    async def shutdown(_: web.Application):
+        # Даем уже принятым апдейтам завершиться до остановки
+        await handler.join(timeout=settings.SHUTDOWN_TIMEOUT_SECONDS)
+        await bot.session.close()
+
+    app.on_shutdown.append(shutdown)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook():
+    dp.startup.register(set_webhook)
+
+    runner = web.AppRunner(create_webhook_app())
+    await runner.setup()
+    await web.TCPSite(runner, host=settings.WEBAPP_HOST, port=settings.WEBAPP_PORT).start()
+    logger.info(f"Webhook server started on {settings.WEBAPP_HOST}:{settings.WEBAPP_PORT}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
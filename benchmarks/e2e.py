@@ -0,0 +1,211 @@
+"""
+Сквозной бенчмарк: синтетические апдейты проходят через настоящие роутеры app.controller
+(dp.feed_raw_update), исходящие запросы и скачивание файлов обслуживает заглушка Bot API,
+сообщения пишутся в локальный Postgres (таблицы создаются через alembic upgrade head).
+
+Сценарии:
+    text_flood   - поток новых сообщений (save_message)
+    media_edits  - правки ранее присланных сообщений с заменой фото (get_last_message, send_message_edited)
+    mass_delete  - удаление ранее присланных сообщений пачками (get_last_messages, сводки об удалении)
+
+Для каждого сценария печатаются пропускная способность, p50/p99 задержки обработки апдейта и память процесса.
+При заданном --rate задержка считается от запланированного момента отправки, а не от фактического.
+
+Запуск:
+    python -m benchmarks.e2e --scenarios text_flood media_edits mass_delete --updates 5000 --rate 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from aiohttp import web
+
+from benchmarks import updates
+from benchmarks.fake_bot_api import FakeBotAPI
+
+SCENARIOS = ("text_flood", "media_edits", "mass_delete")
+
+
+def get_rss_bytes() -> int:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def get_peak_rss_bytes() -> int:
+    # ru_maxrss в Linux - в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def configure_environment(args: argparse.Namespace):
+    """
+    Настройки приложения читаются при импорте app, поэтому окружение выставляется до него.
+    """
+    os.environ["BOT_API_URL"] = f"http://{args.api_host}:{args.api_port}"
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="benchmark-content-"))
+    # Лимиты Telegram на отправку к заглушке не относятся и иначе определяли бы результат
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "1000000")
+    os.environ.setdefault("OUTBOUND_CHAT_RATE", "1000000")
+    os.environ.setdefault("OUTBOUND_CHAT_BURST", "1000000")
+
+
+async def feed(items: List[Dict[str, Any]], rate: float, concurrency: int) -> Tuple[float, List[float], int]:
+    """
+    Прогоняет апдейты через диспетчер. Возвращает длительность, задержки в мс и число ошибок.
+    """
+    from app.loader import bot, dp
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def feed_one(item: Dict[str, Any], scheduled_at: float):
+        nonlocal errors
+        async with semaphore:
+            try:
+                await dp.feed_raw_update(bot, item)
+            except Exception:
+                errors += 1
+        latencies.append((time.perf_counter() - scheduled_at) * 1000)
+
+    tasks = []
+    started = time.perf_counter()
+    for i, item in enumerate(items):
+        scheduled_at = started + i / rate if rate else time.perf_counter()
+        if (delay := scheduled_at - time.perf_counter()) > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(feed_one(item, scheduled_at)))
+        if not rate:
+            # Без ограничения скорости не держим в памяти больше апдейтов, чем обрабатывается
+            while len(tasks) - len(latencies) >= concurrency:
+                await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, latencies, errors
+
+
+async def drain():
+    """
+    Дожидается фоновой работы, начатой апдейтами: пакетной записи, скачиваний и сводок об удалении.
+    """
+    from app.loader import download_pool, user_peer_message_writer, user_writer
+    from app.utils.digest import deletion_digest
+
+    await user_writer.flush()
+    await user_peer_message_writer.flush()
+    await download_pool.queue.join()
+    await deletion_digest.join()
+
+
+async def run_scenario(name: str, args: argparse.Namespace, api: FakeBotAPI, update_id: int) -> Dict[str, Any]:
+    # Идентификаторы сообщений уникальны для каждого запуска, чтобы не пересекаться с прошлыми данными в базе
+    message_id = int(time.time() * 1000)
+    flood = updates.message_flood(
+        args.updates, chats=args.chats, media_ratio=args.media_ratio, start_update_id=update_id,
+        start_message_id=message_id
+    )
+    if name == "text_flood":
+        measured = flood
+    else:
+        # Исходные сообщения отправляются заранее и в замер не входят
+        await feed(flood, rate=0, concurrency=args.concurrency)
+        await drain()
+        keys = updates.get_message_keys(flood)
+        if name == "media_edits":
+            measured = updates.edits(keys, start_update_id=update_id + len(flood))
+        else:
+            measured = updates.mass_delete(keys, batch_size=args.delete_batch, start_update_id=update_id + len(flood))
+
+    calls_before = sum(api.calls.values())
+    rss_before = get_rss_bytes()
+    duration, latencies, errors = await feed(measured, rate=args.rate, concurrency=args.concurrency)
+    rss_after = get_rss_bytes()
+    await drain()
+    # Сводки об удалении и скачивания завершаются уже после замера, но запросы к API учитываем
+    api_calls = sum(api.calls.values()) - calls_before
+
+    return {
+        "scenario": name,
+        "updates": len(measured),
+        "messages": args.updates,
+        "errors": errors,
+        "seconds": round(duration, 3),
+        "updates_per_second": round(len(measured) / duration, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(statistics.quantiles(latencies, n=100)[98], 2) if len(latencies) > 1 else latencies[0],
+        "api_calls": api_calls,
+        "rss_mb": round(rss_after / 2 ** 20, 1),
+        "rss_delta_mb": round((rss_after - rss_before) / 2 ** 20, 1),
+        "peak_rss_mb": round(get_peak_rss_bytes() / 2 ** 20, 1),
+        "next_update_id": update_id + len(flood) + len(measured),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--updates", type=int, default=2000, help="сообщений в сценарии")
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду, 0 - без ограничения")
+    parser.add_argument("--concurrency", type=int, default=100, help="апдейтов в обработке одновременно")
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--media-ratio", type=float, default=0.2, help="доля сообщений с фото")
+    parser.add_argument("--delete-batch", type=int, default=50, help="сообщений в одном апдейте удаления")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="размер файлов, отдаваемых заглушкой")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа заглушки в секундах")
+    parser.add_argument("--api-host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--json", action="store_true", help="печатать результаты в JSON")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    from app.controller import setup_routers
+    from app.loader import bot, dp, download_pool, user_peer_message_writer, user_repository, user_writer
+
+    api = FakeBotAPI(file_size=args.file_size, latency=args.api_latency)
+    runner = web.AppRunner(api.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.api_host, args.api_port).start()
+
+    setup_routers(dp)
+    background = [
+        asyncio.create_task(user_writer.run()),
+        asyncio.create_task(user_peer_message_writer.run()),
+        asyncio.create_task(download_pool.run()),
+    ]
+
+    results = []
+    update_id = 1
+    try:
+        # Владелец бизнес-аккаунта должен существовать: на него ссылаются сохраненные сообщения
+        owner = updates.user(updates.OWNER_ID)
+        await user_repository.upsert_many(
+            [{"id": owner["id"], "username": owner["username"], "full_name": owner["first_name"]}]
+        )
+
+        for name in args.scenarios:
+            result = await run_scenario(name, args, api, update_id)
+            update_id = result.pop("next_update_id")
+            results.append(result)
+            if not args.json:
+                print(
+                    f"{name}: {result['updates']} updates in {result['seconds']:.2f}s "
+                    f"({result['updates_per_second']:.1f} updates/s), p50={result['p50_ms']:.2f}ms "
+                    f"p99={result['p99_ms']:.2f}ms, errors={result['errors']}, api calls={result['api_calls']}, "
+                    f"rss={result['rss_mb']}MB (+{result['rss_delta_mb']}MB), peak rss={result['peak_rss_mb']}MB"
+                )
+    finally:
+        for task in background:
+            task.cancel()
+        await bot.session.close()
+        await runner.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Локальная заглушка Bot API на aiohttp для нагрузочных тестов.
+
+Отдает синтетические апдейты через getUpdates, отвечает на send*-методы и отдает файлы
+заданного размера. Бот направляется на заглушку через настройку BOT_API_URL.
+
+Запуск (режим polling, замер скорости потребления апдейтов ботом):
+    python -m benchmarks.fake_bot_api --port 8081 --updates 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks import updates
+
+SEND_METHODS = {
+    "sendmessage", "sendphoto", "sendaudio", "senddocument", "sendvideo", "sendvideonote", "sendvoice"
+}
+
+
+class FakeBotAPI:
+    def __init__(self, file_size: int = 64 * 1024, latency: float = 0.0):
+        self.file_size = file_size
+        self.latency = latency
+        self.updates: List[Dict[str, Any]] = []
+        self.new_updates = asyncio.Event()
+        self.calls: Counter = Counter()
+        self.sent_message_id = 0
+
+        self.first_served_at: Optional[float] = None
+        self.confirmed_at: Optional[float] = None
+        self.last_update_id = 0
+
+    def put_updates(self, items: List[Dict[str, Any]]):
+        self.updates.extend(items)
+        self.last_update_id = max(update["update_id"] for update in self.updates)
+        self.new_updates.set()
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.*}", self.handle_file)
+        return app
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        self.calls["file"] += 1
+        return web.Response(body=b"\0" * self.file_size)
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = dict(await request.post()) if request.can_read_body else {}
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == "getupdates":
+            result = await self.get_updates(int(data.get("offset", 0)), int(data.get("timeout", 0)))
+        elif method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "FakeBot"}
+        elif method == "getbusinessconnection":
+            result = updates.business_connection()
+        elif method == "getfile":
+            file_id = data["file_id"]
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": self.file_size, "file_path": file_id}
+        elif method in SEND_METHODS:
+            result = self.sent_message(int(data["chat_id"]), data.get("text") or data.get("caption"))
+        elif method == "sendmediagroup":
+            media = json.loads(data["media"])
+            result = [self.sent_message(int(data["chat_id"]), item.get("caption")) for item in media]
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_updates(self, offset: int, timeout: int) -> List[Dict[str, Any]]:
+        if offset:
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            if offset > self.last_update_id and self.last_update_id and self.confirmed_at is None:
+                self.confirmed_at = time.perf_counter()
+
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = self.updates[:100]
+        if batch and self.first_served_at is None:
+            self.first_served_at = time.perf_counter()
+        return batch
+
+    def sent_message(self, chat_id: int, text: Optional[str]) -> Dict[str, Any]:
+        self.sent_message_id += 1
+        return {
+            "message_id": self.sent_message_id, "date": int(time.time()), "chat": updates.chat(chat_id),
+            "text": text or ""
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--updates", type=int, default=10_000)
+    args = parser.parse_args()
+
+    api = FakeBotAPI()
+    api.put_updates(updates.text_flood(args.updates))
+
+    runner = web.AppRunner(api.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake Bot API on http://{args.host}:{args.port}, start the bot with BOT_API_URL pointing here")
+
+    while api.confirmed_at is None:
+        await asyncio.sleep(0.1)
+    duration = api.confirmed_at - api.first_served_at
+    print(f"polling: {args.updates} updates in {duration:.2f}s ({args.updates / duration:.1f} updates/s)")
+    print(f"calls: {dict(api.calls)}")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
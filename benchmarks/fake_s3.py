@@ -0,0 +1,144 @@
+"""
+Локальная заглушка S3 на aiohttp для проверки S3Storage без MinIO.
+
+Хранит объекты в памяти и поддерживает подмножество API, которым пользуется S3Storage:
+PUT/GET/HEAD/DELETE объекта, multipart upload и DeleteObjects. Подпись Signature V4 проверяется.
+
+Запуск:
+    python -m benchmarks.fake_s3 --port 9000
+    STORAGE_BACKEND=s3 S3_ENDPOINT_URL=http://127.0.0.1:9000 S3_BUCKET=content \\
+        S3_ACCESS_KEY=benchmark S3_SECRET_KEY=benchmark python -m app.main
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import uuid
+from collections import Counter
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+from aiohttp import web
+
+ACCESS_KEY = "benchmark"
+SECRET_KEY = "benchmark"
+
+
+class FakeS3:
+    def __init__(self, access_key: str = ACCESS_KEY, secret_key: str = SECRET_KEY):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.calls: Counter = Counter()
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3, middlewares=[self.check_signature])
+        app.router.add_post("/{bucket}", self.delete_objects)
+        app.router.add_route("*", "/{bucket}/{key:.+}", self.handle_object)
+        return app
+
+    def get_signature(self, request: web.Request, body: bytes, signed_headers: List[str], scope: str) -> str:
+        date, region, service, _ = scope.split("/")
+        canonical_request = "\n".join([
+            request.method,
+            request.raw_path.split("?", 1)[0],
+            "&".join(
+                f"{quote(name, safe='~')}={quote(value, safe='~')}" for name, value in sorted(request.query.items())
+            ),
+            "".join(f"{name}:{request.headers[name].strip()}\n" for name in signed_headers),
+            ";".join(signed_headers),
+            hashlib.sha256(body).hexdigest(),
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", request.headers["x-amz-date"], scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (date, region, service, "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    @web.middleware
+    async def check_signature(self, request: web.Request, handler):
+        body = await request.read()
+        try:
+            authorization = request.headers["Authorization"].split(" ", 1)[1]
+            fields = dict(field.strip().split("=", 1) for field in authorization.split(","))
+            access_key, scope = fields["Credential"].split("/", 1)
+            signature = self.get_signature(request, body, fields["SignedHeaders"].split(";"), scope)
+        except (KeyError, ValueError):
+            return web.Response(status=403, text="Malformed authorization")
+        if access_key != self.access_key or not hmac.compare_digest(signature, fields["Signature"]):
+            return web.Response(status=403, text="SignatureDoesNotMatch")
+        return await handler(request)
+
+    async def handle_object(self, request: web.Request) -> web.Response:
+        object_id = (request.match_info["bucket"], request.match_info["key"])
+        query = request.query
+        self.calls[request.method.lower()] += 1
+
+        if request.method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            return web.Response(
+                text=f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+
+        if request.method == "PUT" and "uploadId" in query:
+            data = await request.read()
+            self.uploads[query["uploadId"]][int(query["partNumber"])] = data
+            return web.Response(headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+        if request.method == "POST" and "uploadId" in query:
+            parts = self.uploads.pop(query["uploadId"])
+            numbers = [
+                int(element.text) for element in ElementTree.fromstring(await request.read()).iter("PartNumber")
+            ]
+            self.objects[object_id] = b"".join(parts[number] for number in numbers)
+            return web.Response(text="<CompleteMultipartUploadResult></CompleteMultipartUploadResult>")
+
+        if request.method == "DELETE" and "uploadId" in query:
+            self.uploads.pop(query["uploadId"], None)
+            return web.Response(status=204)
+
+        if request.method == "PUT":
+            self.objects[object_id] = await request.read()
+            return web.Response()
+
+        if request.method == "DELETE":
+            self.objects.pop(object_id, None)
+            return web.Response(status=204)
+
+        if object_id not in self.objects:
+            return web.Response(status=404)
+        if request.method == "HEAD":
+            return web.Response(headers={"Content-Length": str(len(self.objects[object_id]))})
+        return web.Response(body=self.objects[object_id])
+
+    async def delete_objects(self, request: web.Request) -> web.Response:
+        if "delete" not in request.query:
+            return web.Response(status=400)
+        self.calls["delete_objects"] += 1
+        bucket = request.match_info["bucket"]
+        for element in ElementTree.fromstring(await request.read()).iter("Key"):
+            self.objects.pop((bucket, element.text), None)
+        return web.Response(text="<DeleteResult></DeleteResult>")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+
+    runner = web.AppRunner(FakeS3().create_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake S3 on http://{args.host}:{args.port}, access key and secret key: {ACCESS_KEY}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Бенчмарк get_last_message и get_messages_earlier_date с индексом и без него.
+
+Запуск против локальной базы (таблицы должны быть созданы через alembic upgrade head):
+    python -m benchmarks.get_last_message --rows 2000000 --queries 1000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.database.session import engine
+from app.loader import user_peer_message_repository
+
+BENCHMARK_USER_ID = -1
+INDEX_NAME = "ix_userpeermessages_user_chat_message_created_at"
+
+
+async def seed(rows: int, chats: int):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO users (id, username, full_name) VALUES (:id, NULL, 'benchmark') "
+                "ON CONFLICT (id) DO NOTHING"
+            ),
+            {"id": BENCHMARK_USER_ID}
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO userpeermessages (user_id, chat_id, message_id, type, message, text, created_at) "
+                "SELECT :user_id, i % :chats, i, 'TEXT', '{}', 'benchmark', now() - (i % 40) * interval '1 day' "
+                "FROM generate_series(1, :rows) AS i"
+            ),
+            {"user_id": BENCHMARK_USER_ID, "chats": chats, "rows": rows}
+        )
+        await conn.execute(text("ANALYZE userpeermessages"))
+
+
+async def cleanup():
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM userpeermessages WHERE user_id = :id"), {"id": BENCHMARK_USER_ID})
+        await conn.execute(text("DELETE FROM users WHERE id = :id"), {"id": BENCHMARK_USER_ID})
+
+
+async def set_index(enabled: bool):
+    async with engine.begin() as conn:
+        if enabled:
+            await conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+                f"ON userpeermessages (user_id, chat_id, message_id, created_at DESC)"
+            ))
+        else:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+        await conn.execute(text("ANALYZE userpeermessages"))
+
+
+async def measure(rows: int, chats: int, queries: int) -> dict:
+    last_message = []
+    for _ in range(queries):
+        message_id = random.randint(1, rows)
+        started = time.perf_counter()
+        await user_peer_message_repository.get_last_message(
+            user_id=BENCHMARK_USER_ID, chat_id=message_id % chats, message_id=message_id,
+            since=datetime.now() - timedelta(days=30)
+        )
+        last_message.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await user_peer_message_repository.get_messages_earlier_date(from_date=datetime.now() - timedelta(days=30))
+    earlier_date = (time.perf_counter() - started) * 1000
+
+    return {
+        "get_last_message_p50_ms": statistics.median(last_message),
+        "get_last_message_p99_ms": statistics.quantiles(last_message, n=100)[98],
+        "get_messages_earlier_date_ms": earlier_date,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    await seed(args.rows, args.chats)
+    try:
+        for enabled in (False, True):
+            await set_index(enabled)
+            result = await measure(args.rows, args.chats, args.queries)
+            print(f"index={'on' if enabled else 'off'}: " + ", ".join(f"{k}={v:.2f}" for k, v in result.items()))
+    finally:
+        await set_index(True)
+        await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""
+Нагрузочный генератор для режима webhook: отправляет синтетические бизнес-апдейты на webhook бота.
+
+Запуск (бот запущен с UPDATES_MODE=webhook):
+    python -m benchmarks.load_updates --url http://127.0.0.1:8080/webhook --updates 10000 --concurrency 50
+
+Для режима polling используется benchmarks.fake_bot_api.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+from benchmarks import updates
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    queue = asyncio.Queue()
+    for update in updates.text_flood(args.updates):
+        queue.put_nowait(update)
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    latencies = []
+    errors = 0
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            async with session.post(args.url, json=update, headers=headers) as response:
+                if response.status != 200:
+                    errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(args.concurrency)))
+    duration = time.perf_counter() - started
+
+    print(
+        f"webhook: {args.updates} updates in {duration:.2f}s ({args.updates / duration:.1f} updates/s), "
+        f"ack p50={statistics.median(latencies):.2f}ms p99={statistics.quantiles(latencies, n=100)[98]:.2f}ms, "
+        f"errors={errors}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
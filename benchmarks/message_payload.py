@@ -0,0 +1,54 @@
+"""
+Сравнение размера полного model_dump_json и сохраняемой проекции сообщения.
+
+Запуск:
+    python -m benchmarks.message_payload --iterations 10000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from aiogram.types import Chat, Message, MessageEntity, PhotoSize, User
+
+from app.utils.content import get_message_payload
+
+
+def build_message() -> Message:
+    user = User(id=1, is_bot=False, first_name="Ivan", last_name="Ivanov", username="ivan", language_code="ru")
+    chat = Chat(id=1, type="private", first_name="Ivan", last_name="Ivanov", username="ivan")
+    reply_to_message = Message(
+        message_id=1, date=datetime.now(), chat=chat, from_user=user, text="Привет! " * 50,
+        business_connection_id="connection"
+    )
+    return Message(
+        message_id=2, date=datetime.now(), chat=chat, from_user=user, caption="Фото " * 20,
+        photo=[
+            PhotoSize(file_id=f"file_id_{size}", file_unique_id=f"unique_{size}", width=size, height=size)
+            for size in (90, 320, 800, 1280)
+        ],
+        caption_entities=[MessageEntity(type="bold", offset=0, length=4)],
+        reply_to_message=reply_to_message, business_connection_id="connection"
+    )
+
+
+def measure(name: str, dump, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        payload = dump()
+    duration = time.perf_counter() - started
+    print(f"{name}: {len(payload.encode())} bytes, {duration / iterations * 1e6:.1f} us/message")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    message = build_message()
+    measure("model_dump_json", lambda: message.model_dump_json(exclude_none=True), args.iterations)
+    measure("payload", lambda: json.dumps(get_message_payload(message)), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Бенчмарк сессий: отдельная сессия на каждый вызов репозитория против одной сессии на апдейт.
+
+Запуск против локальной базы:
+    python -m benchmarks.session_reuse --updates 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.database.session import engine, unit_of_work
+from app.loader import user_peer_message_repository, user_repository
+
+CALLS_PER_UPDATE = 4
+
+
+async def handle_update(user_id: int, shared: bool) -> float:
+    started = time.perf_counter()
+
+    async def calls():
+        for i in range(CALLS_PER_UPDATE):
+            await user_repository.get_or_none(id=user_id)
+            await user_peer_message_repository.get_last_message(
+                user_id=user_id, chat_id=user_id, message_id=i, since=datetime.now() - timedelta(days=30)
+            )
+
+    if shared:
+        async with unit_of_work():
+            await calls()
+    else:
+        await calls()
+    return (time.perf_counter() - started) * 1000
+
+
+async def run(updates: int, concurrency: int, shared: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(user_id: int) -> float:
+        async with semaphore:
+            return await handle_update(user_id, shared)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(limited(i) for i in range(updates)))
+    duration = time.perf_counter() - started
+    print(
+        f"{'unit of work' if shared else 'session per call'}: {updates / duration:.1f} updates/s, "
+        f"p50={statistics.median(latencies):.2f}ms p99={statistics.quantiles(latencies, n=100)[98]:.2f}ms, "
+        f"pool: {engine.pool.status()}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        for shared in (False, True):
+            await run(args.updates, args.concurrency, shared)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
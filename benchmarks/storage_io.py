@@ -0,0 +1,130 @@
+"""
+Пропускная способность создания и удаления файлов в FileSystemStorage и S3Storage.
+
+Для файловой системы удаление также выполняется по одному файлу через aiofiles (прежний способ).
+S3 по умолчанию проверяется на локальной заглушке benchmarks.fake_s3.
+
+Запуск:
+    python -m benchmarks.storage_io --files 20000 --size 4096 --concurrency 100
+    python -m benchmarks.storage_io --backend s3 --files 5000 --size 65536
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import List
+
+import aiofiles.os
+
+from aiohttp import web
+
+from app.utils.s3 import S3Storage
+from app.utils.storage import FileSystemStorage, Storage
+from app.utils.tasks import gather_with_concurrency
+from benchmarks.fake_s3 import ACCESS_KEY, SECRET_KEY, FakeS3
+
+
+async def create_files(storage: Storage, count: int, size: int, concurrency: int) -> List[str]:
+    content = b"\0" * size
+    keys = [storage.content_key(uuid.uuid4().hex, "file.jpg") for _ in range(count)]
+
+    started = time.perf_counter()
+    await gather_with_concurrency(concurrency, *(storage.save(key, content) for key in keys))
+    duration = time.perf_counter() - started
+    print(f"create: {count} files in {duration:.2f}s ({count / duration:.0f} files/s)")
+    return keys
+
+
+async def delete_one_by_one(keys: List[str], concurrency: int):
+    async def delete(key: str):
+        await aiofiles.os.path.getsize(key)
+        await aiofiles.os.remove(key)
+
+    started = time.perf_counter()
+    await gather_with_concurrency(concurrency, *(delete(key) for key in keys))
+    duration = time.perf_counter() - started
+    print(f"delete one by one: {len(keys)} files in {duration:.2f}s ({len(keys) / duration:.0f} files/s)")
+
+
+async def delete_batch(storage: Storage, keys: List[str]):
+    started = time.perf_counter()
+    freed_bytes = await storage.deleteAll(keys)
+    duration = time.perf_counter() - started
+    print(
+        f"delete batch: {len(keys)} files in {duration:.2f}s ({len(keys) / duration:.0f} files/s), "
+        f"freed {freed_bytes} bytes"
+    )
+
+
+def count_directories(root: str) -> int:
+    return sum(len(directories) for _, directories, _ in os.walk(root))
+
+
+async def run_filesystem(args: argparse.Namespace):
+    root = args.root or tempfile.mkdtemp(prefix="benchmark-storage-")
+    storage = FileSystemStorage(os.path.join(root, "content"), delete_concurrency=args.threads)
+    try:
+        keys = await create_files(storage, args.files, args.size, args.concurrency)
+        print(f"directories after create: {count_directories(storage.root)}")
+        await delete_one_by_one(keys, args.concurrency)
+        print(f"directories after delete one by one: {count_directories(storage.root)}")
+        # Оставшиеся пустые каталоги не должны влиять на замер пакетного удаления
+        shutil.rmtree(storage.root)
+
+        keys = await create_files(storage, args.files, args.size, args.concurrency)
+        await delete_batch(storage, keys)
+        print(f"directories after batch delete: {count_directories(storage.root)}")
+    finally:
+        await storage.close()
+        if not args.root:
+            shutil.rmtree(root)
+
+
+async def run_s3(args: argparse.Namespace):
+    runner = None
+    if not args.s3_endpoint:
+        fake_s3 = FakeS3()
+        runner = web.AppRunner(fake_s3.create_app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 9000).start()
+
+    storage = S3Storage(
+        endpoint_url=args.s3_endpoint or "http://127.0.0.1:9000", bucket=args.s3_bucket,
+        access_key=args.s3_access_key, secret_key=args.s3_secret_key, delete_concurrency=args.threads
+    )
+    try:
+        keys = await create_files(storage, args.files, args.size, args.concurrency)
+        await delete_batch(storage, keys)
+        left = sum(await asyncio.gather(*(storage.exists(key) for key in keys[:100])))
+        print(f"objects left of first 100: {left}")
+    finally:
+        await storage.close()
+        if runner:
+            await runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("filesystem", "s3"), default="filesystem")
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=32, help="потоков (файловая система) или пачек DeleteObjects")
+    parser.add_argument("--root", default=None, help="каталог для файлов, по умолчанию временный")
+    parser.add_argument("--s3-endpoint", default=None, help="по умолчанию запускается локальная заглушка")
+    parser.add_argument("--s3-bucket", default="benchmark")
+    parser.add_argument("--s3-access-key", default=ACCESS_KEY)
+    parser.add_argument("--s3-secret-key", default=SECRET_KEY)
+    args = parser.parse_args()
+
+    if args.backend == "s3":
+        await run_s3(args)
+    else:
+        await run_filesystem(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
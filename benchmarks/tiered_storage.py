@@ -0,0 +1,86 @@
+"""
+Занятость диска и доля попаданий TieredStorage при всплесках записи и повторных отправках.
+
+Файлы пишутся всплесками, между всплесками читаются по распределению Ципфа (свежие и популярные чаще).
+Холодный уровень - второй каталог на диске.
+
+Запуск:
+    python -m benchmarks.tiered_storage --files 5000 --size 65536 --quota-mb 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from app.utils.storage import FileSystemStorage
+from app.utils.tasks import gather_with_concurrency
+from app.utils.tiered import TieredStorage
+
+
+def get_disk_usage(root: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, filename))
+        for directory, _, filenames in os.walk(root) for filename in filenames
+    )
+
+
+async def read(storage: TieredStorage, key: str):
+    async for _ in storage.stream(key):
+        pass
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--quota-mb", type=int, default=64)
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--reads", type=int, default=2000, help="чтений между всплесками")
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="benchmark-tiered-")
+    storage = TieredStorage(
+        hot=FileSystemStorage(os.path.join(root, "hot")), cold=FileSystemStorage(os.path.join(root, "cold")),
+        max_bytes=args.quota_mb * 2 ** 20
+    )
+    content = os.urandom(args.size)
+    keys = []
+    peak_disk = 0
+    started = time.perf_counter()
+    try:
+        for burst in range(args.bursts):
+            new_keys = [
+                storage.content_key(f"burst{burst}-{i}", "video.mp4") for i in range(args.files // args.bursts)
+            ]
+            await gather_with_concurrency(args.concurrency, *(storage.save(key, content) for key in new_keys))
+            keys.extend(new_keys)
+            peak_disk = max(peak_disk, get_disk_usage(storage.hot.root))
+
+            # Свежие файлы в конце списка, поэтому ранг считается от конца
+            ranks = [min(int(random.paretovariate(1.2)) - 1, len(keys) - 1) for _ in range(args.reads)]
+            await gather_with_concurrency(args.concurrency, *(read(storage, keys[-1 - rank]) for rank in ranks))
+            peak_disk = max(peak_disk, get_disk_usage(storage.hot.root))
+
+        await storage.join()
+        peak_disk = max(peak_disk, get_disk_usage(storage.hot.root))
+        duration = time.perf_counter() - started
+        stats = storage.stats()
+        print(
+            f"{len(keys)} files x {args.size} bytes in {duration:.2f}s, quota {args.quota_mb}MB, "
+            f"peak hot disk {peak_disk / 2 ** 20:.1f}MB, occupancy {stats['occupancy']:.2f}"
+        )
+        print(
+            f"hit ratio {stats['hit_ratio']:.3f}, evictions {stats['evictions']}, demotions {stats['demotions']}, "
+            f"promotions {stats['promotions']}"
+        )
+    finally:
+        await storage.close()
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Синтетические апдейты бизнес-аккаунта в формате Bot API.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+OWNER_ID = 1_000_000
+CONNECTION_ID = "benchmark-connection"
+
+
+def user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+
+
+def chat(chat_id: int) -> Dict[str, Any]:
+    return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}", "username": f"user{chat_id}"}
+
+
+def business_connection() -> Dict[str, Any]:
+    return {
+        "id": CONNECTION_ID, "user": user(OWNER_ID), "user_chat_id": OWNER_ID, "date": int(time.time()),
+        "can_reply": True, "is_enabled": True
+    }
+
+
+def message(
+        chat_id: int, message_id: int, text: Optional[str] = None, photo: bool = False, version: int = 0
+) -> Dict[str, Any]:
+    """
+    version меняет файл фото: отредактированное медиа скачивается заново.
+    """
+    payload = {
+        "message_id": message_id, "date": int(time.time()), "chat": chat(chat_id), "from": user(chat_id),
+        "business_connection_id": CONNECTION_ID
+    }
+    if photo:
+        payload["photo"] = [
+            {"file_id": f"photo-{chat_id}-{message_id}-{version}",
+             "file_unique_id": f"p{chat_id}x{message_id}v{version}",
+             "width": 800, "height": 800, "file_size": 64 * 1024}
+        ]
+        payload["caption"] = text
+    else:
+        payload["text"] = text or f"Message {message_id}"
+    return payload
+
+
+def business_message_update(update_id: int, chat_id: int, message_id: int, **kwargs) -> Dict[str, Any]:
+    return {"update_id": update_id, "business_message": message(chat_id, message_id, **kwargs)}
+
+
+def edited_business_message_update(update_id: int, chat_id: int, message_id: int, **kwargs) -> Dict[str, Any]:
+    payload = message(chat_id, message_id, **kwargs)
+    payload["edit_date"] = payload["date"]
+    return {"update_id": update_id, "edited_business_message": payload}
+
+
+def deleted_business_messages_update(update_id: int, chat_id: int, message_ids: List[int]) -> Dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "deleted_business_messages": {
+            "business_connection_id": CONNECTION_ID, "chat": chat(chat_id), "message_ids": message_ids
+        }
+    }
+
+
+def text_flood(count: int, chats: int = 100, start_update_id: int = 1) -> List[Dict[str, Any]]:
+    return [
+        business_message_update(start_update_id + i, chat_id=1 + i % chats, message_id=1 + i)
+        for i in range(count)
+    ]
+
+
+def message_flood(
+        count: int, chats: int = 100, media_ratio: float = 0.0, start_update_id: int = 1, start_message_id: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Новые сообщения вперемешку: доля media_ratio приходит фото с подписью, остальные - текстом.
+    """
+    return [
+        business_message_update(
+            start_update_id + i, chat_id=1 + i % chats, message_id=start_message_id + i,
+            photo=int((i + 1) * media_ratio) > int(i * media_ratio)
+        )
+        for i in range(count)
+    ]
+
+
+def get_message_keys(items: List[Dict[str, Any]]) -> List[Tuple[int, int, bool]]:
+    """
+    (chat_id, message_id, фото ли) для апдейтов с новыми сообщениями.
+    """
+    return [
+        (item["business_message"]["chat"]["id"], item["business_message"]["message_id"],
+         "photo" in item["business_message"])
+        for item in items
+    ]
+
+
+def edits(keys: List[Tuple[int, int, bool]], start_update_id: int = 1) -> List[Dict[str, Any]]:
+    return [
+        edited_business_message_update(
+            start_update_id + i, chat_id=chat_id, message_id=message_id, text=f"Edited {message_id}", photo=photo,
+            version=1
+        )
+        for i, (chat_id, message_id, photo) in enumerate(keys)
+    ]
+
+
+def mass_delete(
+        keys: List[Tuple[int, int, bool]], batch_size: int = 50, start_update_id: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Удаления пачками по batch_size сообщений одного чата, как их присылает Telegram.
+    """
+    message_ids: Dict[int, List[int]] = {}
+    for chat_id, message_id, _ in keys:
+        message_ids.setdefault(chat_id, []).append(message_id)
+
+    items = []
+    for chat_id, ids in message_ids.items():
+        for i in range(0, len(ids), batch_size):
+            items.append(
+                deleted_business_messages_update(start_update_id + len(items), chat_id, ids[i:i + batch_size])
+            )
+    return items
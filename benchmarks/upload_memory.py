@@ -0,0 +1,93 @@
+"""
+Пиковая память процесса при одновременной повторной отправке больших файлов из хранилища.
+
+Сравниваются потоковое чтение (storage.get) и чтение файла в память целиком (BufferedInputFile).
+Загрузки принимает локальный приемник, который читает тело запроса потоком и ничего не хранит.
+
+Запуск:
+    python -m benchmarks.upload_memory --size-mb 50 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import BufferedInputFile
+from aiohttp import web
+
+from app.utils.storage import FileSystemStorage
+from benchmarks import updates
+from benchmarks.e2e import get_rss_bytes
+
+CHAT_ID = 1
+
+
+async def sink(request: web.Request) -> web.Response:
+    async for _ in request.content.iter_any():
+        pass
+    message = {
+        "message_id": 1, "date": int(time.time()), "chat": updates.chat(CHAT_ID),
+        "document": {"file_id": "uploaded", "file_unique_id": "uploaded"}
+    }
+    return web.json_response({"ok": True, "result": message})
+
+
+async def measure(name: str, bot: Bot, make_file, concurrency: int):
+    baseline = peak = get_rss_bytes()
+    done = asyncio.Event()
+
+    async def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, get_rss_bytes())
+            await asyncio.sleep(0.005)
+
+    sampler = asyncio.create_task(sample())
+    started = time.perf_counter()
+    await asyncio.gather(*(bot.send_document(CHAT_ID, make_file()) for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    done.set()
+    await sampler
+    print(f"{name}: {concurrency} uploads in {duration:.2f}s, peak rss +{(peak - baseline) / 2 ** 20:.1f}MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8082)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="benchmark-upload-")
+    storage = FileSystemStorage(root)
+    key = storage.content_key("benchmark", "video.mp4")
+    await storage.prepare(key)
+    with open(key, "wb") as file:
+        file.write(os.urandom(args.size_mb * 2 ** 20))
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", sink)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{args.port}"))
+    bot = Bot(token="1:benchmark", session=session)
+    try:
+        # Потоковый вариант первым: пик RSS процесса после полного чтения в память не опускается
+        await measure("stream", bot, lambda: storage.get(key), args.concurrency)
+        await measure("buffered", bot, lambda: BufferedInputFile.from_file(key), args.concurrency)
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+        await storage.close()
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+"""Store userpeermessages message as jsonb
+
+Revision ID: 0e6b93d4a8c1
+Revises: f3a81c0d7b42
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0e6b93d4a8c1'
+down_revision: Union[str, None] = 'f3a81c0d7b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Раньше в колонку писалась строка с JSON, а не объект
+    op.execute(
+        "ALTER TABLE userpeermessages ALTER COLUMN message TYPE JSONB USING "
+        "CASE WHEN json_typeof(message) = 'string' THEN (message #>> '{}')::jsonb ELSE message::jsonb END"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE userpeermessages ALTER COLUMN message TYPE JSON USING message::json")
@@ -0,0 +1,31 @@
+"""Add userpeermessages lookup index
+
+Revision ID: 5b1f0c9d2e7a
+Revises: a3dcef07065b
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f0c9d2e7a'
+down_revision: Union[str, None] = 'a3dcef07065b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_userpeermessages_user_chat_message_created_at',
+        'userpeermessages',
+        ['user_id', 'chat_id', 'message_id', sa.text('created_at DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_userpeermessages_user_chat_message_created_at', table_name='userpeermessages')
@@ -0,0 +1,32 @@
+"""Drop users username unique constraint
+
+Revision ID: 7d2b9e1f4c6a
+Revises: 0e6b93d4a8c1
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2b9e1f4c6a'
+down_revision: Union[str, None] = '0e6b93d4a8c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Username может перейти к другому аккаунту, а пакетный upsert пользователей не должен падать из-за этого
+    op.drop_constraint('users_username_key', 'users', type_='unique')
+
+
+def downgrade() -> None:
+    # Username остается только у последнего обновленного владельца
+    op.execute(
+        "UPDATE users SET username = NULL WHERE id IN ("
+        "SELECT id FROM (SELECT id, row_number() OVER (PARTITION BY username ORDER BY updated_at DESC) AS position "
+        "FROM users WHERE username IS NOT NULL) AS duplicates WHERE position > 1)"
+    )
+    op.create_unique_constraint('users_username_key', 'users', ['username'])
@@ -0,0 +1,32 @@
+"""Add userpeermessages file_state
+
+Revision ID: 8c4e2a6f1b3d
+Revises: 5b1f0c9d2e7a
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1b3d'
+down_revision: Union[str, None] = '5b1f0c9d2e7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+file_state = sa.Enum('PENDING', 'READY', 'FAILED', name='filestate')
+
+
+def upgrade() -> None:
+    file_state.create(op.get_bind(), checkfirst=True)
+    op.add_column('userpeermessages', sa.Column('file_state', file_state, nullable=True))
+    # Все ранее сохраненные файлы скачивались синхронно
+    op.execute("UPDATE userpeermessages SET file_state = 'READY' WHERE filepath IS NOT NULL")
+
+
+def downgrade() -> None:
+    op.drop_column('userpeermessages', 'file_state')
+    file_state.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,33 @@
+"""Add userpeermessages filepath index
+
+Revision ID: 9a4f6c2e8b15
+Revises: 7d2b9e1f4c6a
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f6c2e8b15'
+down_revision: Union[str, None] = '7d2b9e1f4c6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс создается на секционированной таблице и наследуется всеми секциями
+    op.create_index(
+        'ix_userpeermessages_filepath',
+        'userpeermessages',
+        ['filepath'],
+        unique=False,
+        postgresql_where=sa.text('filepath IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_userpeermessages_filepath', table_name='userpeermessages')
@@ -0,0 +1,25 @@
+"""Add userpeermessages created_at index
+
+Revision ID: d27a9e4c5f10
+Revises: 8c4e2a6f1b3d
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd27a9e4c5f10'
+down_revision: Union[str, None] = '8c4e2a6f1b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_userpeermessages_created_at', 'userpeermessages', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_userpeermessages_created_at', table_name='userpeermessages')
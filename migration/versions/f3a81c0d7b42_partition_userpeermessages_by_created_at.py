@@ -0,0 +1,90 @@
+"""Partition userpeermessages by created_at
+
+Revision ID: f3a81c0d7b42
+Revises: d27a9e4c5f10
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a81c0d7b42'
+down_revision: Union[str, None] = 'd27a9e4c5f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DAYS_AHEAD = 7
+
+
+def recreate_indexes(table: str) -> None:
+    op.create_index('ix_userpeermessages_created_at', table, ['created_at'], unique=False)
+    op.execute(
+        f"CREATE INDEX ix_userpeermessages_user_chat_message_created_at "
+        f"ON {table} (user_id, chat_id, message_id, created_at DESC)"
+    )
+
+
+def detach_old_table() -> None:
+    op.execute("ALTER TABLE userpeermessages RENAME TO userpeermessages_old")
+    op.execute("ALTER TABLE userpeermessages_old RENAME CONSTRAINT userpeermessages_pkey TO userpeermessages_old_pkey")
+    op.execute("DROP INDEX ix_userpeermessages_created_at")
+    op.execute("DROP INDEX ix_userpeermessages_user_chat_message_created_at")
+    # Последовательность id переходит к новой таблице
+    op.execute("ALTER SEQUENCE userpeermessages_id_seq OWNED BY NONE")
+
+
+def attach_new_table() -> None:
+    op.execute("INSERT INTO userpeermessages SELECT * FROM userpeermessages_old")
+    op.execute("DROP TABLE userpeermessages_old")
+    op.execute("ALTER SEQUENCE userpeermessages_id_seq OWNED BY userpeermessages.id")
+    recreate_indexes('userpeermessages')
+
+
+def upgrade() -> None:
+    detach_old_table()
+    op.execute(
+        "CREATE TABLE userpeermessages ("
+        "LIKE userpeermessages_old INCLUDING DEFAULTS, "
+        "PRIMARY KEY (id, created_at), "
+        "FOREIGN KEY (user_id) REFERENCES users (id)"
+        ") PARTITION BY RANGE (created_at)"
+    )
+    op.execute("CREATE TABLE userpeermessages_default PARTITION OF userpeermessages DEFAULT")
+    # Дневные секции для уже сохраненных сообщений и на несколько дней вперед
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            day date;
+        BEGIN
+            FOR day IN
+                SELECT generate_series(
+                    COALESCE((SELECT min(created_at)::date FROM userpeermessages_old), current_date),
+                    current_date + {DAYS_AHEAD},
+                    interval '1 day'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE userpeermessages_p%s PARTITION OF userpeermessages FOR VALUES FROM (%L) TO (%L)',
+                    to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+            END LOOP;
+        END $$;
+        """
+    )
+    attach_new_table()
+
+
+def downgrade() -> None:
+    detach_old_table()
+    op.execute(
+        "CREATE TABLE userpeermessages ("
+        "LIKE userpeermessages_old INCLUDING DEFAULTS, "
+        "PRIMARY KEY (id), "
+        "FOREIGN KEY (user_id) REFERENCES users (id)"
+        ")"
+    )
+    attach_new_table()